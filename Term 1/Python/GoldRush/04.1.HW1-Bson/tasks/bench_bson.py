@@ -0,0 +1,294 @@
+"""
+Бенчмарк всех вариантов bson.py на синтетических корпусах.
+
+Для каждой пары (вариант, корпус) меряет marshal и unmarshal: МБ/с, документов в секунду
+и пиковую память (tracemalloc, отдельным прогоном). Результаты пишутся в JSON,
+который можно сравнить с прошлым прогоном через --compare.
+
+    python bench_bson.py
+    python bench_bson.py --variants mvp keep_more_types --corpora flat deep --scale 0.2
+    python bench_bson.py --output new.json --compare old.json
+    python bench_bson.py --variants keep_more_types --corpora --records 1000000
+
+--records N дополнительно меряет N дата-классов общим путём Mapper и через Mapper.register
+(у вариантов, где он есть): marshal против marshal с планом, unmarshal + Record(**doc) против unmarshal_as.
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import platform
+import random
+import string
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from dataclasses import dataclass
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable
+
+TASKS_DIR = Path(__file__).resolve().parent
+
+Point = namedtuple("Point", ["x", "y", "label"])
+
+
+@dataclass
+class Record:
+    id: int
+    name: str
+    score: float
+    active: bool
+    weight: float
+
+
+# ====================
+# CORPORA
+# ====================
+# region
+def _flat(rng: random.Random, count: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "id": i,
+            "big": rng.randrange(2 ** 40),
+            "score": rng.random(),
+            "name": "".join(rng.choices(string.ascii_letters, k=12)),
+            "active": rng.random() < 0.5,
+            "parent": None,
+        }
+        for i in range(count)
+    ]
+
+
+def _deep(rng: random.Random, count: int, depth: int = 40) -> list[dict[str, Any]]:
+    docs = []
+    for i in range(count):
+        doc: dict[str, Any] = {"leaf": i}
+        for level in range(depth):
+            doc = {"level": level, "items": [rng.random(), doc]} if level % 2 else {"level": level, "child": doc}
+        docs.append(doc)
+    return docs
+
+
+def _wide(rng: random.Random, count: int, width: int = 1000) -> list[dict[str, Any]]:
+    keys = [f"field_{i:04d}" for i in range(width)]
+    return [{key: rng.randrange(1000) for key in keys} for _ in range(count)]
+
+
+def _string_heavy(rng: random.Random, count: int) -> list[dict[str, Any]]:
+    alphabet = string.ascii_letters + "абвгдежзийклмнопрстуфхцчшщыэюя "
+    return [{f"s{j}": "".join(rng.choices(alphabet, k=rng.randrange(256, 2048))) for j in range(20)}
+            for _ in range(count)]
+
+
+def _binary_heavy(rng: random.Random, count: int) -> list[dict[str, Any]]:
+    return [{"id": i, "blobs": [rng.randbytes(rng.randrange(4096, 65536)) for _ in range(4)]} for i in range(count)]
+
+
+def _namedtuple_heavy(rng: random.Random, count: int) -> list[dict[str, Any]]:
+    return [{"points": [Point(rng.random(), rng.random(), f"p{j}") for j in range(50)]} for _ in range(count)]
+
+
+def _records(rng: random.Random, count: int) -> list[Record]:
+    return [Record(i, "".join(rng.choices(string.ascii_letters, k=12)), rng.random(), rng.random() < 0.5,
+                   rng.random() * 100) for i in range(count)]
+
+
+# имя -> (генератор, число документов при scale=1)
+CORPORA: dict[str, tuple[Callable[[random.Random, int], list[dict[str, Any]]], int]] = {
+    "flat": (_flat, 20000),
+    "deep": (_deep, 1000),
+    "wide": (_wide, 100),
+    "string_heavy": (_string_heavy, 300),
+    "binary_heavy": (_binary_heavy, 100),
+    "namedtuple_heavy": (_namedtuple_heavy, 500),
+}
+# endregion
+
+
+# ====================
+# MEASUREMENT
+# ====================
+# region
+def discover_variants() -> list[str]:
+    return sorted(path.parent.name for path in TASKS_DIR.glob("*/bson.py"))
+
+
+def load_variant(name: str) -> ModuleType:
+    spec = importlib.util.spec_from_file_location(f"bson_{name}", TASKS_DIR / name / "bson.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _best_time(func: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_memory(func: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _row(variant: str, corpus: str, op: str, docs: int, size: int, seconds: float, peak: int) -> dict[str, Any]:
+    return {
+        "variant": variant,
+        "corpus": corpus,
+        "op": op,
+        "docs": docs,
+        "bytes": size,
+        "seconds": seconds,
+        "mb_per_s": size / seconds / 1e6 if seconds else None,
+        "docs_per_s": docs / seconds if seconds else None,
+        "peak_bytes": peak,
+    }
+
+
+def bench_variant(variant: str, module: ModuleType, corpus: str, docs: list[dict[str, Any]],
+                  repeat: int) -> list[dict[str, Any]]:
+    """Меряет marshal и unmarshal одного варианта; неподдерживаемый корпус даёт строку с error."""
+    if not hasattr(module, "marshal") or not hasattr(module, "unmarshal"):
+        return [{"variant": variant, "corpus": corpus, "op": op, "error": "no marshal/unmarshal"}
+                for op in ("marshal", "unmarshal")]
+
+    marshal, unmarshal = module.marshal, module.unmarshal
+    try:
+        blobs = [marshal(doc) for doc in docs]
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        return [{"variant": variant, "corpus": corpus, "op": op, "error": error} for op in ("marshal", "unmarshal")]
+    size = sum(len(blob) for blob in blobs)
+
+    rows = [_row(variant, corpus, "marshal", len(docs), size,
+                 _best_time(lambda: [marshal(doc) for doc in docs], repeat),
+                 _peak_memory(lambda: [marshal(doc) for doc in docs]))]
+    try:
+        unmarshal(blobs[0])
+    except Exception as e:
+        rows.append({"variant": variant, "corpus": corpus, "op": "unmarshal", "error": f"{type(e).__name__}: {e}"})
+        return rows
+    rows.append(_row(variant, corpus, "unmarshal", len(docs), size,
+                     _best_time(lambda: [unmarshal(blob) for blob in blobs], repeat),
+                     _peak_memory(lambda: [unmarshal(blob) for blob in blobs])))
+    return rows
+
+
+def bench_records(variant: str, module: ModuleType, records: list[Record], repeat: int) -> list[dict[str, Any]]:
+    """Меряет записи общим путём Mapper и через скомпилированный план Mapper.register."""
+    if not hasattr(getattr(module, "Mapper", None), "register"):
+        return [{"variant": variant, "corpus": "records", "op": op, "error": "no Mapper.register"}
+                for op in ("marshal_generic", "marshal_compiled", "unmarshal_generic", "unmarshal_compiled")]
+
+    generic, compiled = module.Mapper(), module.Mapper()
+    compiled.register(Record)
+    blobs = [compiled.marshal(record) for record in records]
+    size = sum(len(blob) for blob in blobs)
+    count = len(records)
+
+    def run(op: str, func: Callable[[], Any]) -> dict[str, Any]:
+        return _row(variant, "records", op, count, size, _best_time(func, repeat), _peak_memory(func))
+
+    return [
+        run("marshal_generic", lambda: [generic.marshal(record) for record in records]),
+        run("marshal_compiled", lambda: [compiled.marshal(record) for record in records]),
+        run("unmarshal_generic", lambda: [Record(**generic.unmarshal(blob)) for blob in blobs]),
+        run("unmarshal_compiled", lambda: [compiled.unmarshal_as(blob, Record) for blob in blobs]),
+    ]
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=TASKS_DIR, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+# endregion
+
+
+# ====================
+# REPORT
+# ====================
+# region
+def print_table(rows: list[dict[str, Any]]) -> None:
+    print(f"{'variant':<16} {'corpus':<17} {'op':<18} {'MB/s':>9} {'docs/s':>11} {'peak MB':>9}")
+    for row in rows:
+        head = f"{row['variant']:<16} {row['corpus']:<17} {row['op']:<18}"
+        if "error" in row:
+            print(f"{head} {row['error']}")
+        else:
+            print(f"{head} {row['mb_per_s']:>9.2f} {row['docs_per_s']:>11.0f} {row['peak_bytes'] / 2 ** 20:>9.1f}")
+
+
+def print_comparison(rows: list[dict[str, Any]], baseline_path: Path) -> None:
+    """Печатает отношение docs/s к прошлому прогону; > 1 значит быстрее."""
+    baseline = json.loads(baseline_path.read_text())
+    old = {(r["variant"], r["corpus"], r["op"]): r for r in baseline["results"] if "error" not in r}
+    print(f"\ncompared with {baseline_path} ({baseline.get('commit') or 'unknown commit'})")
+    for row in rows:
+        before = old.get((row["variant"], row["corpus"], row["op"]))
+        if "error" in row or before is None:
+            continue
+        print(f"{row['variant']:<16} {row['corpus']:<17} {row['op']:<18} "
+              f"x{row['docs_per_s'] / before['docs_per_s']:.2f} speed, "
+              f"x{row['peak_bytes'] / max(before['peak_bytes'], 1):.2f} peak memory")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", nargs="+", default=None, help="варианты (папки с bson.py), по умолчанию все")
+    parser.add_argument("--corpora", nargs="*", default=list(CORPORA), choices=list(CORPORA))
+    parser.add_argument("--records", type=int, default=0, help="число записей для сравнения с Mapper.register")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель размера корпусов")
+    parser.add_argument("--repeat", type=int, default=3, help="число замеров, берётся лучший")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--compare", type=Path, default=None, help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args(argv)
+
+    # глубокий корпус рекурсивным вариантам нужен с запасом по стеку
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+    variants = args.variants or discover_variants()
+    modules = {name: load_variant(name) for name in variants}
+    rows = []
+    for corpus in args.corpora:
+        generate, count = CORPORA[corpus]
+        docs = generate(random.Random(args.seed), max(1, int(count * args.scale)))
+        for name in variants:
+            rows.extend(bench_variant(name, modules[name], corpus, docs, args.repeat))
+    if args.records > 0:
+        records = _records(random.Random(args.seed), args.records)
+        for name in variants:
+            rows.extend(bench_records(name, modules[name], records, args.repeat))
+
+    print_table(rows)
+    args.output.write_text(json.dumps({
+        "commit": _git_commit(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "seed": args.seed,
+        "results": rows,
+    }, indent=2))
+    print(f"\nresults written to {args.output}")
+
+    if args.compare is not None:
+        print_comparison(rows, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+# endregion
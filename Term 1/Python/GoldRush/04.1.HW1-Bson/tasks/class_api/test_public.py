@@ -2311,3 +2311,27 @@ def test_unmarshal_all_bool_all_mappers() -> None:
                     [9, 0, 0, 0, 8, 98, 0, v, 0],
                 )
             )
+
+
+def test_stream_roundtrip_many_documents() -> None:
+    import io
+
+    docs = [{"i": i, "s": "x" * i, "l": [i, str(i)]} for i in range(50)]
+    stream = io.BytesIO()
+    assert bson.marshal_many(docs, stream) == len(docs)
+    assert stream.getvalue() == b"".join(bson.marshal(d) for d in docs)
+
+    stream.seek(0)
+    assert list(bson.iter_unmarshal(stream)) == docs
+    assert list(bson.iter_unmarshal(io.BytesIO())) == []
+
+
+def test_stream_truncated_document() -> None:
+    import io
+
+    data = bson.marshal({"a": 1}) + bson.marshal({"b": "abc"})
+    for cut in (2, 9):
+        docs = bson.iter_unmarshal(io.BytesIO(data[:-cut]))
+        assert next(docs) == {"a": 1}
+        with pytest.raises(bson.BsonNotEnoughDataError):
+            next(docs)
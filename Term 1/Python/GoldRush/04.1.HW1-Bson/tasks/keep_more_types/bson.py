@@ -1,8 +1,22 @@
+import asyncio
 import base64
+import mmap
+import os
 import struct
+import sys
+import threading
+import time
+import weakref
 import datetime
-from typing import Any
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from itertools import count, groupby
+from array import array
+from collections.abc import Mapping, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, BinaryIO, Iterable, Iterator, get_type_hints
 from dataclasses import fields as dataclass_fields
+from operator import attrgetter
 
 TYPE_DOUBLE = 1
 TYPE_STRING = 2
@@ -22,6 +36,51 @@ MAX_BYTES_SIZE = 2 ** 32 - 1
 MAX_DOCUMENT_SIZE = 16 * 1024 * 1024
 TYPES = (str, int, float, bytes, bytearray, type(None),
          bool, dict, list, tuple, datetime.datetime)
+PYTHON_ONLY_TYPES = (
+    TYPE_DOUBLE, TYPE_STRING, TYPE_DOCUMENT, TYPE_ARRAY,
+    TYPE_BINARY, TYPE_BOOLEAN, TYPE_DATETIME, TYPE_NULL,
+    TYPE_INT32, TYPE_INT64
+)
+BytesLike = bytes | bytearray | memoryview | mmap.mmap
+
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+STRUCT_INT32 = struct.Struct("<i")
+STRUCT_INT64 = struct.Struct("<q")
+STRUCT_DOUBLE = struct.Struct("<d")
+STRUCT_UINT32 = struct.Struct("<I")
+# первый байт payload __metadata__ с подсказками в виде серий: (uint32 длина, hint\x00)*
+METADATA_RUNS = 1
+# type code -> dtype колонки в unmarshal_columns; порядок байт совпадает с BSON
+COLUMN_DTYPES = {
+    TYPE_INT32: "<i4",
+    TYPE_INT64: "<i8",
+    TYPE_DOUBLE: "<f8",
+    TYPE_BOOLEAN: "?",
+    TYPE_DATETIME: "<i8",
+    TYPE_STRING: object,
+}
+# marshal_batch/unmarshal_batch: меньшие пачки обрабатываются в текущем процессе
+BATCH_MIN_DOCS = 1024
+# read_document разбирает документ в event loop, только если по оценке уложится в столько секунд
+ASYNC_DECODE_BUDGET = 0.002
+# документы короче не уточняют оценку скорости разбора: в них доминируют постоянные расходы
+ASYNC_RATE_MIN_SIZE = 4096
+# тип, ключ "__metadata__\x00", размер и подтип binary-элемента с метаданными
+METADATA_HEADER_SIZE = 1 + len(b"__metadata__\x00") + 4 + 1
+# массивы не короче этого разбираются и кодируются целиком, если все элементы одного числового типа
+ARRAY_BULK_MIN = 16
+# сколько ключей-индексов массива b"0\x00", b"1\x00", ... держит _INDEX_KEYS
+INDEX_KEY_CACHE_SIZE = 65536
+# заголовок sidecar-индекса BsonFile: сигнатура, размер файла данных, число документов
+INDEX_MAGIC = b"BSONIDX2"
+# magic, размер, st_mtime_ns и st_ino файла данных, число документов
+STRUCT_INDEX_HEADER = struct.Struct("<8sqqqq")
+# сколько ключей держат кэши _KEY_BYTES и _KEY_STRS; при переполнении кэш очищается целиком
+KEY_CACHE_SIZE = 4096
+# с какого окна _read_cstring начинает поиск нулевого байта
+KEY_SCAN_WINDOW = 64
 
 
 # ====================
@@ -85,10 +144,335 @@ class BsonInvalidArrayError(Exception):
 # endregion
 
 
+class NamedTupleCache:
+    """
+    LRU-кэш namedtuple-классов, восстановленных из метаданных при unmarshal.
+    Ключ - (name, tuple(fields), defaults), так что одинаковые описания дают один и тот же класс.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._classes: OrderedDict = OrderedDict()
+
+    def get(self, name: str, fields: list[str], defaults: dict[str, Any]) -> type:
+        try:
+            key = (name, tuple(fields), tuple(sorted(defaults.items())))
+            hash(key)
+        except TypeError:
+            # нехешируемые значения по умолчанию: класс строим без кэша
+            self.misses += 1
+            return _make_namedtuple(name, fields, defaults)
+
+        if key in self._classes:
+            self.hits += 1
+            self._classes.move_to_end(key)
+            return self._classes[key]
+
+        self.misses += 1
+        cls = _make_namedtuple(name, fields, defaults)
+        self._classes[key] = cls
+        if len(self._classes) > self.max_size:
+            self._classes.popitem(last=False)
+        return cls
+
+    def __len__(self) -> int:
+        return len(self._classes)
+
+
+# общий для процесса кэш, используется мапперами с shared_nt_cache=True
+SHARED_NT_CACHE = NamedTupleCache(1024)
+
+# пути обхода marshal для проверки циклов, по одному на поток (см. Mapper._path)
+_MARSHAL_PATHS = threading.local()
+
+
+# восстановленные классы по токену (pid, номер): копии и пиклы внутри процесса возвращаются к тому же классу
+_NT_BY_TOKEN: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+_nt_tokens = count()
+
+
+def _make_namedtuple(name: str, fields: list[str], defaults: dict[str, Any]) -> type:
+    cls = namedtuple(name, fields)
+    # класс создан динамически и по имени не импортируется, поэтому экземпляры пиклятся через токен,
+    # а в другом процессе - через SHARED_NT_CACHE с тем же ключом
+    cls._bson_token = (os.getpid(), next(_nt_tokens))
+    cls._bson_defaults = defaults
+    cls.__reduce__ = _reduce_namedtuple
+    _NT_BY_TOKEN[cls._bson_token] = cls
+    return cls
+
+
+def _reduce_namedtuple(obj: tuple) -> tuple:
+    cls = type(obj)
+    return _rebuild_namedtuple, (cls._bson_token, cls.__name__, cls._fields, cls._bson_defaults, tuple(obj))
+
+
+def _rebuild_namedtuple(token: tuple[int, int], name: str, fields: tuple[str, ...], defaults: dict[str, Any],
+                        values: tuple) -> tuple:
+    cls = _NT_BY_TOKEN.get(token)
+    if cls is None:
+        cls = SHARED_NT_CACHE.get(name, list(fields), defaults)
+    return cls(*values)
+
+
+class HintRuns(Sequence):
+    """
+    Подсказки типов в формате серий без разворачивания: индекс ищется бинарным поиском
+    по накопленным длинам серий, так что память пропорциональна числу серий, а не элементов.
+    """
+
+    __slots__ = ("_ends", "_hints")
+
+    def __init__(self, ends: list[int], hints: list[str]):
+        self._ends = ends
+        self._hints = hints
+
+    def __len__(self) -> int:
+        return self._ends[-1] if self._ends else 0
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("hint index out of range")
+        return self._hints[bisect_right(self._ends, index)]
+
+
+class ClassSchema:
+    """
+    Что и в каком порядке сериализуется у объектов класса: поля дата-класса и читаемые свойства.
+    Вычисляется один раз на класс, дальше на каждый объект остаются только чтения атрибутов.
+    """
+
+    def __init__(self, cls: type):
+        self.fields: list[str] = []
+        if hasattr(cls, "__dataclass_fields__"):
+            self.fields = [f.name for f in dataclass_fields(cls)]
+        self.properties: list[str] = []
+        for attr_name in dir(cls):
+            if attr_name.startswith('__'):
+                continue
+            attr = getattr(cls, attr_name)
+            if isinstance(attr, property) and attr.fget is not None:
+                self.properties.append(attr_name)
+        self._getter = attrgetter(*self.fields) if self.fields else None
+
+    def field_values(self, obj: Any) -> tuple:
+        if self._getter is None:
+            return ()
+        values = self._getter(obj)
+        return values if len(self.fields) > 1 else (values,)
+
+
+# класс -> ClassSchema; слабые ключи не держат классы, созданные на лету
+_CLASS_SCHEMAS: "weakref.WeakKeyDictionary[type, ClassSchema]" = weakref.WeakKeyDictionary()
+
+
+def _class_schema(cls: type) -> ClassSchema:
+    schema = _CLASS_SCHEMAS.get(cls)
+    if schema is None:
+        schema = ClassSchema(cls)
+        _CLASS_SCHEMAS[cls] = schema
+    return schema
+
+
+# общие для процесса кэши ключей документов: ключ -> b"ключ\x00" при marshal
+# и сырые байты -> интернированная строка при unmarshal, чтобы повторяющиеся ключи не кодировались
+# и не создавались заново в каждом документе
+_KEY_BYTES: dict[str, bytes] = {}
+_KEY_STRS: dict[bytes, str] = {}
+_INDEX_KEYS: list[bytes] = []
+# размер значения без типа и ключа для типов, у которых он не зависит от значения
+_FIXED_SIZES = {type(None): 0, bool: 1, float: 8, datetime.datetime: 8}
+# тип элемента -> формат значения в struct для массивов фиксированной ширины
+_FIXED_ARRAY_FORMATS = {TYPE_INT32: "i", TYPE_INT64: "q", TYPE_DOUBLE: "d", TYPE_DATETIME: "q", TYPE_BOOLEAN: "?"}
+# (число цифр ключа, тип элемента) -> Struct записи тип + ключ + значение
+_FIXED_RECORDS: dict[tuple[int, int], struct.Struct] = {}
+
+
+def _index_keys(count: int) -> list[bytes]:
+    """Ключи элементов массива b"0\x00" .. b"{count - 1}\x00"; первые INDEX_KEY_CACHE_SIZE берутся из кэша."""
+    cached = len(_INDEX_KEYS)
+    if count > cached and cached < INDEX_KEY_CACHE_SIZE:
+        _INDEX_KEYS.extend(b"%d\x00" % i for i in range(cached, min(count, INDEX_KEY_CACHE_SIZE)))
+        cached = len(_INDEX_KEYS)
+    if count <= cached:
+        return _INDEX_KEYS[:count]
+    return _INDEX_KEYS + [b"%d\x00" % i for i in range(cached, count)]
+
+
+def _fixed_record(digits: int, element_type: int) -> struct.Struct:
+    record = _FIXED_RECORDS.get((digits, element_type))
+    if record is None:
+        record = struct.Struct(f"<B{digits + 1}s{_FIXED_ARRAY_FORMATS[element_type]}")
+        _FIXED_RECORDS[digits, element_type] = record
+    return record
+
+
+class RecordPlan:
+    """
+    Скомпилированный план (де)сериализации зарегистрированного дата-класса или namedtuple.
+
+    Порядок ключей фиксирован, для каждого поля заранее готовы байты "тип + ключ + \\x00".
+    Подряд идущие поля float/bool пишутся и читаются одним struct.Struct.
+    Если тип значения не совпал с аннотацией, поле пишется общим _marshal_element.
+    """
+
+    def __init__(self, cls: type):
+        self.cls = cls
+        self.is_namedtuple = issubclass(cls, tuple) and hasattr(cls, "_fields")
+        if self.is_namedtuple:
+            self.fields = list(cls._fields)
+        elif hasattr(cls, "__dataclass_fields__"):
+            # decode собирает экземпляр через конструктор, поле с init=False в него не передать
+            skipped = [f.name for f in dataclass_fields(cls) if not f.init]
+            if skipped:
+                raise MapperConfigError(f"Fields with init=False cannot be registered: {', '.join(skipped)}")
+            self.fields = [f.name for f in dataclass_fields(cls)]
+        else:
+            raise MapperConfigError(f"Only dataclasses and namedtuples can be registered, got {cls}")
+        for name in self.fields:
+            if "\x00" in name:
+                raise BsonKeyWithZeroByteError("Key contains NUL")
+
+        try:
+            annotations = get_type_hints(cls)
+        except Exception:
+            annotations = {}
+
+        self._getter = attrgetter(*self.fields) if len(self.fields) > 1 else None
+        # шаги кодирования: ("run", Struct, [(index, type)], prefixes) | ("int", index, key) | ("str", ...) | ("any", ...)
+        self.steps: list[tuple] = []
+        run: list[tuple[int, type]] = []
+        for index, name in enumerate(self.fields):
+            key = name.encode("utf-8") + b"\x00"
+            hint = annotations.get(name)
+            if hint is float or hint is bool:
+                run.append((index, hint))
+                continue
+            self._close_run(run)
+            run = []
+            if hint is int:
+                self.steps.append(("int", index, name, bytes([TYPE_INT32]) + key, bytes([TYPE_INT64]) + key))
+            elif hint is str:
+                self.steps.append(("str", index, name, bytes([TYPE_STRING]) + key))
+            else:
+                self.steps.append(("any", index, name, key))
+        self._close_run(run)
+
+    def _close_run(self, run: list[tuple[int, type]]) -> None:
+        if not run:
+            return
+        fmt = "<"
+        prefixes = []
+        for index, hint in run:
+            prefix = bytes([TYPE_DOUBLE if hint is float else TYPE_BOOLEAN]) + self.fields[index].encode("utf-8") + b"\x00"
+            fmt += f"{len(prefix)}s" + ("d" if hint is float else "?")
+            prefixes.append(prefix)
+        self.steps.append(("run", struct.Struct(fmt), run, tuple(prefixes)))
+
+    def values(self, obj: Any) -> tuple:
+        if self.is_namedtuple:
+            return obj
+        if self._getter is None:
+            return tuple(getattr(obj, name) for name in self.fields)
+        return self._getter(obj)
+
+    def encode(self, mapper: "Mapper", out: bytearray, obj: Any, depth: int) -> None:
+        values = self.values(obj)
+        start = mapper._reserve_size(out)
+        for step in self.steps:
+            kind = step[0]
+            if kind == "run":
+                _, packer, run, prefixes = step
+                if all(type(values[index]) is hint for index, hint in run):
+                    args = []
+                    for (index, _), prefix in zip(run, prefixes):
+                        args.append(prefix)
+                        args.append(values[index])
+                    out += packer.pack(*args)
+                else:
+                    for index, _ in run:
+                        mapper._marshal_element(out, self.fields[index], values[index], depth)
+                continue
+
+            _, index, name, *prefix = step
+            value = values[index]
+            if kind == "int" and type(value) is int and INT32_MIN <= value < INT32_MAX:
+                out += prefix[0]
+                out += STRUCT_INT32.pack(value)
+            elif kind == "int" and type(value) is int and INT64_MIN <= value < INT64_MAX:
+                out += prefix[1]
+                out += STRUCT_INT64.pack(value)
+            elif kind == "str" and type(value) is str:
+                encoded = value.encode("utf-8")
+                if len(encoded) + 1 > MAX_STRING_SIZE:
+                    raise BsonStringTooBigError
+                out += prefix[0]
+                out += STRUCT_INT32.pack(len(encoded) + 1)
+                out += encoded
+                out.append(0)
+            else:
+                mapper._marshal_element(out, name, value, depth)
+
+        if mapper._finish_size(out, start) > MAX_DOCUMENT_SIZE:
+            raise BsonDocumentTooBigError
+
+    def decode(self, mapper: "Mapper", buf: memoryview, end: int) -> Any | None:
+        """Разбирает документ, записанный в порядке полей плана; при любом расхождении возвращает None."""
+        values: list[Any] = []
+        pos = 4
+        for step in self.steps:
+            if step[0] == "run":
+                _, packer, run, prefixes = step
+                if pos + packer.size > end - 1:
+                    return None
+                unpacked = packer.unpack_from(buf, pos)
+                if unpacked[0::2] != prefixes:
+                    return None
+                values.extend(unpacked[1::2])
+                pos += packer.size
+                continue
+
+            name = step[2]
+            if pos >= end - 1:
+                return None
+            element_type = buf[pos]
+            key, pos = mapper._read_cstring(buf, pos + 1, end)
+            if key != name or element_type not in PYTHON_ONLY_TYPES:
+                return None
+            if element_type == TYPE_BINARY:
+                pos, value, _ = mapper._parse_binary(buf, pos, end, False)
+            else:
+                pos, value = mapper._parse_supported_value(element_type, buf, pos, end)
+            values.append(value)
+
+        if pos != end - 1 or buf[pos] != 0:
+            return None
+        if self.is_namedtuple:
+            return self.cls(*values)
+        # по именам: у kw_only дата-классов позиционного конструктора нет
+        return self.cls(**dict(zip(self.fields, values)))
+
+
 class Mapper:
     _DEFAULTS = {
         "python_only": False,
         "keep_types": False,
+        # return binary values as memoryview slices of the input instead of bytes copies
+        "zero_copy": False,
+        # how many reconstructed namedtuple classes to keep; ignored with shared_nt_cache
+        "nt_cache_size": 256,
+        # use the process-wide SHARED_NT_CACHE instead of a per-mapper one
+        "shared_nt_cache": False,
+        # write keep_types hints as runs when that is shorter than the ":"-joined text;
+        # readers before this format cannot decode such documents
+        "compact_metadata": False,
+        # nesting depth from which marshal tracks containers on the current path to detect cycles;
+        # keep it well below the recursion limit, or a cycle surfaces as RecursionError
+        "cycle_check_depth": 32,
     }
 
     def __init__(self, **kwargs):
@@ -108,6 +492,51 @@ class Mapper:
         # during unmarshal we may fill this from parsed __metadata__ types
         self._parsed_nt_metadata: dict[str, dict] | None = None
 
+        # порог копируется из конфигурации: на горячем пути __getattr__ слишком дорог
+        self._cycle_check_depth = self.cycle_check_depth
+
+        # скомпилированные планы зарегистрированных классов; таблица кодировщиков копируется при register
+        self._plans: dict[type, RecordPlan] = {}
+        self._encoders = self._ENCODERS
+
+        # namedtuple-классы, восстановленные при unmarshal, чтобы не создавать класс на каждый экземпляр
+        if self.shared_nt_cache:
+            self._nt_classes = SHARED_NT_CACHE
+        else:
+            self._nt_classes = NamedTupleCache(self.nt_cache_size)
+
+    def register(self, cls: type) -> type:
+        """
+        Регистрирует дата-класс или namedtuple: для него компилируется RecordPlan,
+        и marshal/unmarshal_as обходят общий путь _marshal_dict_like. Возвращает cls,
+        поэтому годится как декоратор. При keep_types планы не используются.
+        """
+        self._plans[cls] = RecordPlan(cls)
+        if self._encoders is self._ENCODERS:
+            self._encoders = dict(self._ENCODERS)
+        self._encoders[cls] = Mapper._marshal_subdocument
+        return cls
+
+    @property
+    def nt_cache_hits(self) -> int:
+        return self._nt_classes.hits
+
+    @property
+    def nt_cache_misses(self) -> int:
+        return self._nt_classes.misses
+
+    @property
+    def _path(self) -> set[int]:
+        """
+        id контейнеров на текущем пути marshal глубже cycle_check_depth. Множество своё у каждого потока,
+        поэтому один маппер можно звать из нескольких потоков сразу; finally-блоки оставляют его пустым.
+        """
+        try:
+            return _MARSHAL_PATHS.path
+        except AttributeError:
+            path = _MARSHAL_PATHS.path = set()
+            return path
+
     def __getattr__(self, name):
         if name in self._config:
             return self._config[name]
@@ -170,7 +599,7 @@ class Mapper:
         if hint == "tuple" and isinstance(value, list):
             return tuple(value)
         # bytearray -> convert bytes to bytearray
-        if hint == "bytearray" and isinstance(value, bytes):
+        if hint == "bytearray" and isinstance(value, (bytes, memoryview)):
             return bytearray(value)
         # namedtuple hint: 'nt-X'
         if hint.startswith("nt-"):
@@ -182,12 +611,11 @@ class Mapper:
                     # if metadata not present, leave as dict
                     return value
                 # build namedtuple instance using metadata
-                from collections import namedtuple
                 name = meta.get("name", "NT")
                 fields = list(meta.get("fields", []))
                 defaults = meta.get("defaults", {}) or {}
                 try:
-                    NT = namedtuple(name, fields)
+                    NT = self._nt_classes.get(name, fields, defaults)
                 except Exception:
                     return value
                 # prepare kwargs for constructor: take from dict or defaults
@@ -207,12 +635,11 @@ class Mapper:
                 meta = types.get(hint)
                 if not meta:
                     return value
-                from collections import namedtuple
                 name = meta.get("name", "NT")
                 fields = list(meta.get("fields", []))
                 defaults = meta.get("defaults", {}) or {}
                 try:
-                    NT = namedtuple(name, fields)
+                    NT = self._nt_classes.get(name, fields, defaults)
                 except Exception:
                     return value
                 args = []
@@ -227,7 +654,7 @@ class Mapper:
                     return value
         return value
 
-    def apply_metadata(self, value: Any, metadata: list[str] | None) -> Any:
+    def apply_metadata(self, value: Any, metadata: Sequence[str] | None) -> Any:
         """Применяет список type-hint'ов к значениям документа или массива."""
         if not metadata:
             return value
@@ -245,8 +672,9 @@ class Mapper:
 
         # array/list → применяем по индексам
         if isinstance(value, list):
-            for i, hint in enumerate(metadata):
-                if i < len(value) and hint:
+            for i in range(min(len(value), len(metadata))):
+                hint = metadata[i]
+                if hint:
                     value[i] = self._apply_type_hint(value[i], hint)
             return value
 
@@ -270,9 +698,8 @@ class Mapper:
         fields = list(meta.get("fields", []))
         defaults = meta.get("defaults", {}) or {}
 
-        from collections import namedtuple
         try:
-            NT = namedtuple(name, fields)
+            NT = self._nt_classes.get(name, fields, defaults)
         except Exception:
             return obj
 
@@ -295,25 +722,16 @@ class Mapper:
 
     def _get_readable_properties(self, obj: Any) -> dict[str, Any] | None:
         readable_props = {}
-        found_any = False
 
-        for attr_name in dir(obj.__class__):
-            if attr_name.startswith('__'):
+        for attr_name in _class_schema(obj.__class__).properties:
+            try:
+                readable_props[attr_name] = getattr(obj, attr_name)
+            except RecursionError:
+                raise
+            except Exception:
                 continue
 
-            attr = getattr(obj.__class__, attr_name)
-
-            if isinstance(attr, property) and attr.fget is not None:
-                try:
-                    value = getattr(obj, attr_name)
-                    readable_props[attr_name] = value
-                    found_any = True
-                except RecursionError:
-                    raise
-                except Exception:
-                    continue
-
-        return readable_props if found_any else None
+        return readable_props or None
 
     # --- MARSHAL METHODS ---
     def marshal(self, data: Any) -> bytes:
@@ -322,19 +740,154 @@ class Mapper:
         self._nt_type_to_id = {}
         self._nt_metadata = {}
 
-        visited: set[int] = set()
+        out = bytearray()
         # pass root flag True for the outermost document
-        result = self._marshal_document(data, visited, root=True)
-        return result
+        self._marshal_document(out, data, 0, root=True)
+        return bytes(out)
+
+    def encoded_size(self, data: Any) -> int:
+        """
+        Точный размер marshal(data) в байтах, посчитанный обходом без кодирования значений.
+        Для несериализуемых данных бросает те же ошибки, что и кодировщики, но без обёртки
+        в BsonMarshalError, которую добавляет _marshal_document.
+        """
+        self._nt_counter = 0
+        self._nt_type_to_id = {}
+        self._nt_metadata = {}
+        return self._document_size(data, 0, root=True)
+
+    def _document_size(self, data: Any, depth: int, root: bool = False) -> int:
+        tracked = depth >= self._cycle_check_depth
+        if tracked:
+            path = self._path
+            obj_id = id(data)
+            if obj_id in path:
+                raise BsonCycleDetectedError
+            path.add(obj_id)
+
+        try:
+            plan = self._plans.get(type(data))
+            if plan is not None and not self._config["keep_types"]:
+                items = zip(plan.fields, plan.values(data))
+            elif isinstance(data, dict):
+                if not all(isinstance(k, str) for k in data.keys()):
+                    raise BsonUnsupportedKeyError("All keys must be str")
+                # с keep_types порядок как у marshal: от него зависят серии подсказок и номера namedtuple-типов
+                items = [(key, data[key]) for key in sorted(data)] if self._config["keep_types"] else data.items()
+            elif self._is_namedtuple(data):
+                self._register_namedtuple_type(type(data))
+                items = zip(data._fields, data)
+            elif self._is_dataclass_instance(data):
+                schema = _class_schema(data.__class__)
+                items = zip(schema.fields, schema.field_values(data))
+            else:
+                props = self._get_readable_properties(data)
+                if not props:
+                    raise BsonUnsupportedObjectError(f"Unsupported dict-like object: {type(data)}")
+                items = [(key, props[key]) for key in sorted(props)]
+            return self._elements_size(items, depth, root)
+        finally:
+            if tracked:
+                path.remove(obj_id)
+
+    def _elements_size(self, items: Iterable[tuple[str, Any]], depth: int, root: bool) -> int:
+        """Размер документа из пар ключ-значение, включая __metadata__, который допишет keep_types."""
+        size = 5
+        if not self._config["keep_types"]:
+            value_size = self._value_size
+            for key, value in items:
+                encoded = _KEY_BYTES.get(key)
+                if encoded is None:
+                    encoded = self._checked_cstring(key)
+                fixed = _FIXED_SIZES.get(type(value))
+                size += 1 + len(encoded) + (fixed if fixed is not None else value_size(value, depth))
+            return size
+
+        # подсказки считаются по ходу обхода: так namedtuple-типы получают те же номера, что и в marshal
+        type_hints: list[str] = []
+        for key, value in items:
+            type_hints.append(self._get_type_hint(value))
+            size += 1 + len(self._checked_cstring(key)) + self._value_size(value, depth)
+
+        if any(type_hints):
+            size += METADATA_HEADER_SIZE + len(self._hints_payload(type_hints))
+        if root and self._nt_metadata:
+            types_doc = Mapper(keep_types=False).marshal({"types": self._nt_metadata})
+            size += METADATA_HEADER_SIZE + 1 + len(types_doc)
+        return size
+
+    def _checked_cstring(self, key: str) -> bytes:
+        if not isinstance(key, str):
+            raise BsonUnsupportedKeyError
+        if "\x00" in key:
+            raise BsonKeyWithZeroByteError("Key contains NUL")
+        return self._cstring(key)
+
+    def _value_size(self, value: Any, depth: int) -> int:
+        # порядок проверок как в _marshal_other; точные типы из _ENCODERS проходят те же ветки
+        kind = type(value)
+        if kind in self._plans:
+            return self._document_size(value, depth + 1)
+        if value is None:
+            return 0
+        if isinstance(value, bool):
+            return 1
+        if isinstance(value, int):
+            if INT32_MIN <= value < INT32_MAX:
+                return 4
+            if INT64_MIN <= value < INT64_MAX:
+                return 8
+            raise BsonIntegerTooBigError
+        if isinstance(value, (float, datetime.datetime)):
+            return 8
+        if isinstance(value, str):
+            size = len(value) if value.isascii() else len(value.encode("utf-8"))
+            if size + 1 > MAX_STRING_SIZE:
+                raise BsonStringTooBigError
+            return 5 + size
+        if isinstance(value, (bytes, bytearray)):
+            if len(value) + 1 > MAX_BYTES_SIZE:
+                raise BsonBinaryTooBigError
+            return 5 + len(value)
+        if kind in (list, tuple):
+            return self._array_size(value, depth + 1)
+        if (isinstance(value, dict) or self._is_namedtuple(value) or self._is_dataclass_instance(value)
+                or self._get_readable_properties(value) is not None):
+            return self._document_size(value, depth + 1)
+        if isinstance(value, (list, tuple)):
+            return self._array_size(value, depth + 1)
+        raise BsonUnsupportedObjectError(f"Unsupported object type: {type(value)}")
+
+    def _array_size(self, arr: list[Any] | tuple[Any], depth: int) -> int:
+        tracked = depth >= self._cycle_check_depth
+        if tracked:
+            path = self._path
+            obj_id = id(arr)
+            if obj_id in path:
+                raise BsonCycleDetectedError("Cycle detected in array")
+            path.add(obj_id)
+        try:
+            if self._config["keep_types"]:
+                return self._elements_size(zip(map(str, range(len(arr))), arr), depth, False)
+            # байт типа и ключ-индекс у каждого элемента, ключи берутся из того же кэша, что и в marshal
+            size = 5 + len(arr) + sum(map(len, _index_keys(len(arr))))
+            value_size = self._value_size
+            for value in arr:
+                fixed = _FIXED_SIZES.get(type(value))
+                size += fixed if fixed is not None else value_size(value, depth)
+            return size
+        finally:
+            if tracked:
+                path.remove(obj_id)
 
-    def _marshal_dict_like(self, data: dict[str, Any], keys_order: list[str], visited: set[int],
-                           root: bool = False) -> bytes:
-        """Сериализует словарь или его подобие в байты BSON."""
+    def _marshal_dict_like(self, out: bytearray, data: dict[str, Any], keys_order: list[str], depth: int,
+                           root: bool = False) -> None:
+        """Сериализует словарь или его подобие в конец out за один проход."""
         for key in keys_order:
             if "\x00" in key:
                 raise BsonKeyWithZeroByteError("Key contains NUL")
 
-        elements = []
+        start = self._reserve_size(out)
         type_hints: list[str] = []
         has_significant_hints = False
 
@@ -344,22 +897,14 @@ class Mapper:
             type_hints.append(hint)
             if hint:
                 has_significant_hints = True
-            elements.append(self._marshal_element(key, value, visited))
+            self._marshal_element(out, key, value, depth)
+            # в out только текущий корневой документ: если он уже больше предела, дописывать незачем
+            if len(out) > MAX_DOCUMENT_SIZE:
+                raise BsonDocumentTooBigError
 
         # Добавление метаданных: старые hints (children) для types внутри документа/массива
         if self.keep_types and has_significant_hints:
-            metadata_str = ":".join(type_hints)
-            encoded_meta = metadata_str.encode("utf-8")
-
-            meta_key = "__metadata__"
-            meta_payload = (
-                    bytes([TYPE_BINARY]) +
-                    self._cstring(meta_key) +
-                    struct.pack("<i", len(encoded_meta)) +
-                    bytes([SUBTYPE_USER_METADATA]) +
-                    encoded_meta
-            )
-            elements.append(meta_payload)
+            self._write_metadata(out, self._hints_payload(type_hints))
 
         # Если есть зарегистрированные namedtuple-типы во всём дереве и это корневой документ,
         # добавляем новый формат метаданных types (с префиксом \x00 + BSON(types_doc))
@@ -368,42 +913,118 @@ class Mapper:
             meta_doc = {"types": self._nt_metadata}
             # используем временный mapper без keep_types чтобы не закрутиться рекурсией
             helper = Mapper(keep_types=False)
-            meta_bson = helper._marshal_document(meta_doc, set(), root=False)
-            payload = b"\x00" + meta_bson
-            meta_key = "__metadata__"
-            meta_payload = (
-                bytes([TYPE_BINARY]) +
-                self._cstring(meta_key) +
-                struct.pack("<i", len(payload)) +
-                bytes([SUBTYPE_USER_METADATA]) +
-                payload
-            )
-            elements.append(meta_payload)
-
-        body = bytearray()
-        for el_bytes in elements:
-            body.extend(el_bytes)
-
-        body.append(0)
-        total_len = 4 + len(body)
+            # payload = b"\x00" + BSON(types_doc), документ пишется прямо в out
+            meta_start = self._begin_metadata(out)
+            out.append(0)
+            helper._marshal_document(out, meta_doc, 0, root=False)
+            self._end_metadata(out, meta_start)
+
+        total_len = self._finish_size(out, start)
         if total_len > MAX_DOCUMENT_SIZE:
             raise BsonDocumentTooBigError
-        return struct.pack("<i", total_len) + body
 
-    def _marshal_document(self, data: Any, visited: set[int], root: bool = False) -> bytes:
+    @staticmethod
+    def _reserve_size(out: bytearray) -> int:
+        """Резервирует 4 байта под длину документа; возвращает их позицию."""
+        start = len(out)
+        out += b"\x00\x00\x00\x00"
+        return start
+
+    @staticmethod
+    def _finish_size(out: bytearray, start: int) -> int:
+        """Закрывает документ нулевым байтом и дописывает его длину в зарезервированное место."""
+        out.append(0)
+        total_len = len(out) - start
+        STRUCT_INT32.pack_into(out, start, total_len)
+        return total_len
+
+    def _write_metadata(self, out: bytearray, payload: bytes) -> None:
+        """Дописывает в out элемент __metadata__ с пользовательским подтипом binary."""
+        meta_start = self._begin_metadata(out)
+        out += payload
+        self._end_metadata(out, meta_start)
+
+    def _hints_payload(self, type_hints: list[str]) -> bytes:
+        """Кодирует подсказки типов текстом через ":" или, с compact_metadata, сериями, если так короче."""
+        text = ":".join(type_hints).encode("utf-8")
+        if not self.compact_metadata:
+            return text
+        runs = bytearray([METADATA_RUNS])
+        for hint, group in groupby(type_hints):
+            runs += STRUCT_UINT32.pack(sum(1 for _ in group))
+            runs += self._cstring(hint)
+            if len(runs) >= len(text):
+                return text
+        return bytes(runs)
+
+    @staticmethod
+    def _decode_hint_runs(value: memoryview, size: int) -> HintRuns:
+        """
+        Читает серии (uint32 длина, hint\x00) в HintRuns, не разворачивая их.
+        size - длина документа с метаданными: у каждого его элемента есть байт типа
+        и нулевой байт ключа, поэтому подсказок не может быть больше size // 2.
+        """
+        raw = bytes(value)
+        ends: list[int] = []
+        hints: list[str] = []
+        total, max_hints = 0, size // 2
+        pos = 1
+        while pos < len(raw):
+            zero = raw.find(0, pos + 4)
+            if zero < 0:
+                raise BsonBadStringDataError("Invalid metadata runs")
+            count = STRUCT_UINT32.unpack_from(raw, pos)[0]
+            total += count
+            if total > max_hints:
+                raise BsonBrokenDataError("Metadata runs describe more elements than the document holds")
+            try:
+                hint = str(raw[pos + 4:zero], "utf-8")
+            except UnicodeDecodeError:
+                raise BsonBadStringDataError("Invalid UTF-8 in metadata")
+            if count:
+                ends.append(total)
+                hints.append(hint)
+            pos = zero + 1
+        return HintRuns(ends, hints)
+
+    @staticmethod
+    def _begin_metadata(out: bytearray) -> int:
+        out.append(TYPE_BINARY)
+        out += b"__metadata__\x00"
+        start = len(out)
+        out += b"\x00\x00\x00\x00"
+        out.append(SUBTYPE_USER_METADATA)
+        return start
+
+    @staticmethod
+    def _end_metadata(out: bytearray, start: int) -> None:
+        # длина binary не учитывает сам размер и байт подтипа
+        STRUCT_INT32.pack_into(out, start, len(out) - start - 5)
+
+    def _marshal_document(self, out: bytearray, data: Any, depth: int, root: bool = False) -> None:
         """Маршрутизатор для сериализации документа."""
-        obj_id = id(data)
-        if obj_id in visited:
-            raise BsonCycleDetectedError
-        visited.add(obj_id)
+        # на небольшой глубине цикл невозможен без дальнейшего спуска, поэтому id отслеживаются
+        # только начиная с cycle_check_depth и только на текущем пути
+        tracked = depth >= self._cycle_check_depth
+        if tracked:
+            path = self._path
+            obj_id = id(data)
+            if obj_id in path:
+                raise BsonCycleDetectedError
+            path.add(obj_id)
 
         try:
+            # 0. зарегистрированный класс со скомпилированным планом
+            plan = self._plans.get(type(data))
+            if plan is not None and not self.keep_types:
+                return plan.encode(self, out, data, depth)
+
             # 1. dict
             if isinstance(data, dict):
                 if not all(isinstance(k, str) for k in data.keys()):
                     raise BsonUnsupportedKeyError("All keys must be str")
                 keys_order = sorted(data.keys())
-                return self._marshal_dict_like(data, keys_order, visited, root=root)
+                return self._marshal_dict_like(out, data, keys_order, depth, root=root)
 
             # 2. namedtuple
             if self._is_namedtuple(data):
@@ -412,19 +1033,20 @@ class Mapper:
                 # serialize its fields as a dict
                 keys_order = list(data._fields)
                 data_dict = data._asdict()
-                return self._marshal_dict_like(data_dict, keys_order, visited, root=root)
+                return self._marshal_dict_like(out, data_dict, keys_order, depth, root=root)
 
             # 3. dataclass
             if self._is_dataclass_instance(data):
-                keys_order = [f.name for f in dataclass_fields(data)]
-                data_dict = {name: getattr(data, name) for name in keys_order}
-                return self._marshal_dict_like(data_dict, keys_order, visited, root=root)
+                schema = _class_schema(data.__class__)
+                keys_order = schema.fields
+                data_dict = dict(zip(keys_order, schema.field_values(data)))
+                return self._marshal_dict_like(out, data_dict, keys_order, depth, root=root)
 
             # 4. object with properties
             readable_props = self._get_readable_properties(data)
             if readable_props:
                 keys_order = sorted(readable_props.keys())
-                return self._marshal_dict_like(readable_props, keys_order, visited, root=root)
+                return self._marshal_dict_like(out, readable_props, keys_order, depth, root=root)
 
             raise BsonUnsupportedObjectError(f"Unsupported dict-like object: {type(data)}")
 
@@ -441,58 +1063,95 @@ class Mapper:
         except Exception:
             raise BsonMarshalError(f"Error during structured object marshalling: {type(data)}")
         finally:
-            visited.remove(obj_id)
+            if tracked:
+                path.remove(obj_id)
 
-    def _marshal_element(self, key: str, value: Any, visited: set[int]) -> bytes:
-        """Сериализует пару ключ-значение."""
+    def _marshal_element(self, out: bytearray, key: str, value: Any, depth: int) -> None:
+        """Сериализует пару ключ-значение в конец out."""
         if not isinstance(key, str) or "\x00" in key:
             raise BsonUnsupportedKeyError
 
+        # точный тип ищем в таблице, подклассы и объекты идут по общему пути
+        encoder = self._encoders.get(type(value), Mapper._marshal_other)
+        encoder(self, out, key, value, depth)
+
+    def _marshal_null(self, out: bytearray, key: str, value: None, depth: int) -> None:
+        out.append(TYPE_NULL)
+        out += self._cstring(key)
+
+    def _marshal_bool(self, out: bytearray, key: str, value: bool, depth: int) -> None:
+        out.append(TYPE_BOOLEAN)
+        out += self._cstring(key)
+        out.append(1 if value else 0)
+
+    def _marshal_int(self, out: bytearray, key: str, value: int, depth: int) -> None:
+        if INT32_MIN <= value < INT32_MAX:
+            out.append(TYPE_INT32)
+            out += self._cstring(key)
+            out += STRUCT_INT32.pack(value)
+        elif INT64_MIN <= value < INT64_MAX:
+            out.append(TYPE_INT64)
+            out += self._cstring(key)
+            out += STRUCT_INT64.pack(value)
+        else:
+            raise BsonIntegerTooBigError
+
+    def _marshal_float(self, out: bytearray, key: str, value: float, depth: int) -> None:
+        out.append(TYPE_DOUBLE)
+        out += self._cstring(key)
+        out += STRUCT_DOUBLE.pack(value)
+
+    def _marshal_str(self, out: bytearray, key: str, value: str, depth: int) -> None:
+        encoded = value.encode("utf-8")
+        if len(encoded) + 1 > MAX_STRING_SIZE:
+            raise BsonStringTooBigError
+        out.append(TYPE_STRING)
+        out += self._cstring(key)
+        out += STRUCT_INT32.pack(len(encoded) + 1)
+        out += encoded
+        out.append(0)
+
+    def _marshal_binary(self, out: bytearray, key: str, value: bytes | bytearray, depth: int) -> None:
+        if len(value) + 1 > MAX_BYTES_SIZE:
+            raise BsonBinaryTooBigError
+        out.append(TYPE_BINARY)
+        out += self._cstring(key)
+        out += STRUCT_INT32.pack(len(value))
+        out.append(0)
+        out += value
+
+    def _marshal_datetime(self, out: bytearray, key: str, value: datetime.datetime, depth: int) -> None:
+        msec = int((value - EPOCH).total_seconds() * 1000)
+        out.append(TYPE_DATETIME)
+        out += self._cstring(key)
+        out += STRUCT_INT64.pack(msec)
+
+    def _marshal_subdocument(self, out: bytearray, key: str, value: Any, depth: int) -> None:
+        out.append(TYPE_DOCUMENT)
+        out += self._cstring(key)
+        self._marshal_document(out, value, depth + 1, root=False)
+
+    def _marshal_subarray(self, out: bytearray, key: str, value: list[Any] | tuple[Any], depth: int) -> None:
+        out.append(TYPE_ARRAY)
+        out += self._cstring(key)
+        self._marshal_array(out, value, depth + 1)
+
+    def _marshal_other(self, out: bytearray, key: str, value: Any, depth: int) -> None:
+        """Общий путь для подклассов и пользовательских объектов: порядок проверок как в исходной цепочке."""
         if value is None:
-            return bytes([TYPE_NULL]) + self._cstring(key)
-
+            return self._marshal_null(out, key, value, depth)
         if isinstance(value, bool):
-            return bytes([TYPE_BOOLEAN]) + self._cstring(key) + (b"\x01" if value else b"\x00")
-
+            return self._marshal_bool(out, key, value, depth)
         if isinstance(value, int):
-            if -2 ** 31 <= value < 2 ** 31:
-                return bytes([TYPE_INT32]) + self._cstring(key) + struct.pack("<i", value)
-            elif -2 ** 63 <= value < 2 ** 63:
-                return bytes([TYPE_INT64]) + self._cstring(key) + struct.pack("<q", value)
-            else:
-                raise BsonIntegerTooBigError
-
+            return self._marshal_int(out, key, value, depth)
         if isinstance(value, float):
-            return bytes([TYPE_DOUBLE]) + self._cstring(key) + struct.pack("<d", value)
-
+            return self._marshal_float(out, key, value, depth)
         if isinstance(value, str):
-            encoded = value.encode("utf-8")
-            if len(encoded) + 1 > MAX_STRING_SIZE:
-                raise BsonStringTooBigError
-            return (
-                    bytes([TYPE_STRING])
-                    + self._cstring(key)
-                    + struct.pack("<i", len(encoded) + 1)
-                    + encoded
-                    + b"\x00"
-            )
-
+            return self._marshal_str(out, key, value, depth)
         if isinstance(value, (bytes, bytearray)):
-            data = bytes(value)
-            if len(data) + 1 > MAX_BYTES_SIZE:
-                raise BsonBinaryTooBigError
-            return (
-                    bytes([TYPE_BINARY])
-                    + self._cstring(key)
-                    + struct.pack("<i", len(data))
-                    + b"\x00"
-                    + data
-            )
-
+            return self._marshal_binary(out, key, value, depth)
         if isinstance(value, datetime.datetime):
-            start = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
-            msec = int((value - start).total_seconds() * 1000)
-            return bytes([TYPE_DATETIME]) + self._cstring(key) + struct.pack("<q", msec)
+            return self._marshal_datetime(out, key, value, depth)
 
         is_dict_like = (
                 isinstance(value, dict) or
@@ -502,84 +1161,429 @@ class Mapper:
         )
 
         if is_dict_like:
-            return bytes([TYPE_DOCUMENT]) + self._cstring(key) + self._marshal_document(value, visited, root=False)
+            return self._marshal_subdocument(out, key, value, depth)
 
         if isinstance(value, (list, tuple)):
-            return bytes([TYPE_ARRAY]) + self._cstring(key) + self._marshal_array(value, visited)
+            return self._marshal_subarray(out, key, value, depth)
 
         raise BsonUnsupportedObjectError(f"Unsupported object type: {type(value)}")
 
-    def _marshal_array(self, arr: list[Any] | tuple[Any], visited: set[int]) -> bytes:
-        obj_id = id(arr)
-        if obj_id in visited:
-            raise BsonCycleDetectedError("Cycle detected in array")
-        visited.add(obj_id)
+    # кодировщики по точному типу значения; bool стоит отдельно, так как type(True) is bool
+    _ENCODERS = {
+        type(None): _marshal_null,
+        bool: _marshal_bool,
+        int: _marshal_int,
+        float: _marshal_float,
+        str: _marshal_str,
+        bytes: _marshal_binary,
+        bytearray: _marshal_binary,
+        datetime.datetime: _marshal_datetime,
+        dict: _marshal_subdocument,
+        list: _marshal_subarray,
+        tuple: _marshal_subarray,
+    }
+
+    def _marshal_array(self, out: bytearray, arr: list[Any] | tuple[Any], depth: int) -> None:
+        tracked = depth >= self._cycle_check_depth
+        if tracked:
+            path = self._path
+            obj_id = id(arr)
+            if obj_id in path:
+                raise BsonCycleDetectedError("Cycle detected in array")
+            path.add(obj_id)
         try:
-            elements = []
+            start = self._reserve_size(out)
+            if len(arr) >= ARRAY_BULK_MIN and self._marshal_fixed_array(out, arr):
+                self._finish_size(out, start)
+                return
+
             type_hints: list[str] = []
             has_significant_hints = False
 
             for i, val in enumerate(arr):
-                key_str = str(i)
                 hint = self._get_type_hint(val)
                 type_hints.append(hint)
                 if hint:
                     has_significant_hints = True
 
-                elements.append(self._marshal_element(key_str, val, visited))
+                self._marshal_element(out, str(i), val, depth)
+                if len(out) > MAX_DOCUMENT_SIZE:
+                    raise BsonDocumentTooBigError
 
             if self.keep_types and has_significant_hints:
-                metadata_str = ":".join(type_hints)
-                encoded_meta = metadata_str.encode("utf-8")
-
-                meta_key = "__metadata__"
-
-                meta_payload = (
-                        bytes([TYPE_BINARY]) +
-                        self._cstring(meta_key) +
-                        struct.pack("<i", len(encoded_meta)) +
-                        bytes([SUBTYPE_USER_METADATA]) +
-                        encoded_meta
-                )
-                elements.append(meta_payload)
-
-            body = bytearray()
-            for el_bytes in elements:
-                body.extend(el_bytes)
-
-            body.append(0)
-            total_len = 4 + len(body)
-            return struct.pack("<i", total_len) + body
+                self._write_metadata(out, self._hints_payload(type_hints))
+
+            self._finish_size(out, start)
         finally:
-            visited.remove(obj_id)
+            if tracked:
+                path.remove(obj_id)
+
+    @staticmethod
+    def _marshal_fixed_array(out: bytearray, arr: list[Any] | tuple[Any]) -> bool:
+        """
+        Кодирует массив из элементов одного типа int, float или datetime разом: значения пакуются
+        подряд, ключи берутся из _INDEX_KEYS. Подсказок keep_types у таких элементов нет.
+        Возвращает False, если массив неоднороден и его надо кодировать поэлементно.
+        """
+        kinds = set(map(type, arr))
+        if len(kinds) != 1:
+            return False
+        kind = kinds.pop()
+
+        if kind is int:
+            low, high = min(arr), max(arr)
+            if INT32_MIN <= low and high < INT32_MAX:
+                prefix, values = bytes([TYPE_INT32]), map(STRUCT_INT32.pack, arr)
+            elif INT64_MIN <= low and high < INT64_MAX:
+                # ширина выбирается для каждого значения, как в _marshal_int
+                parts = []
+                for key, value in zip(_index_keys(len(arr)), arr):
+                    if INT32_MIN <= value < INT32_MAX:
+                        parts += (b"\x10", key, STRUCT_INT32.pack(value))
+                    else:
+                        parts += (b"\x12", key, STRUCT_INT64.pack(value))
+                out += b"".join(parts)
+                return True
+            else:
+                raise BsonIntegerTooBigError
+        elif kind is float:
+            prefix, values = bytes([TYPE_DOUBLE]), map(STRUCT_DOUBLE.pack, arr)
+        elif kind is datetime.datetime:
+            prefix = bytes([TYPE_DATETIME])
+            values = [STRUCT_INT64.pack(int((value - EPOCH).total_seconds() * 1000)) for value in arr]
+        else:
+            return False
+
+        # тип, ключ и значение каждого элемента раскладываются по срезам одного списка
+        parts = [prefix] * (3 * len(arr))
+        parts[1::3] = _index_keys(len(arr))
+        parts[2::3] = values
+        out += b"".join(parts)
+        return True
 
     @staticmethod
     def _cstring(s: str) -> bytes:
-        return s.encode("utf-8") + b"\x00"
+        encoded = _KEY_BYTES.get(s)
+        if encoded is None:
+            encoded = s.encode("utf-8") + b"\x00"
+            if len(_KEY_BYTES) >= KEY_CACHE_SIZE:
+                _KEY_BYTES.clear()
+            _KEY_BYTES[s] = encoded
+        return encoded
 
     # --- UNMARSHAL METHODS ---
 
-    def unmarshal(self, data: bytes) -> dict[str, Any]:
-        if len(data) < 4:
+    def unmarshal(self, data: BytesLike, fields: Iterable[str] | None = None) -> dict[str, Any]:
+        """
+        Разбирает документ. Если заданы fields (пути через точку, например "a.b"),
+        разбираются только они, остальные элементы пропускаются по заголовкам длины.
+        """
+        # весь разбор идёт через один memoryview: срезы не копируют байты входа
+        buf = self._as_memoryview(data)
+        try:
+            size = self._root_size(buf)
+
+            # reset parsed types
+            self._parsed_nt_metadata = None
+
+            if fields is not None:
+                nt_types = self._scan_root_types(buf, size) if self.keep_types else None
+                _, result = self._parse_projected(buf, 0, size, self._fields_tree(fields), nt_types)
+                return result
+
+            _, result, _ = self._parse_document(buf, 0, size)
+            return result
+        finally:
+            # zero_copy-срезы держат буфер сами, поэтому родительский view можно отпустить
+            buf.release()
+
+    def unmarshal_as(self, data: BytesLike, cls: type) -> Any:
+        """
+        Разбирает документ в экземпляр зарегистрированного класса по его RecordPlan.
+        Если порядок или типы полей не совпали с планом, разбирает общим путём и вызывает cls(**doc).
+        """
+        plan = self._plans.get(cls)
+        if plan is None:
+            raise MapperConfigError(f"{cls} is not registered")
+
+        if not self.keep_types:
+            with self._as_memoryview(data) as buf:
+                result = plan.decode(self, buf, self._root_size(buf))
+            if result is not None:
+                return result
+
+        doc = self.unmarshal(data)
+        return doc if isinstance(doc, cls) else cls(**doc)
+
+    def unmarshal_lazy(self, data: BytesLike) -> "LazyDocument":
+        """
+        Возвращает ленивое представление документа: проверяется только размер,
+        ключи индексируются при первом обращении, значения разбираются по запросу.
+        """
+        buf = self._as_memoryview(data)
+        return LazyDocument(self, buf, 0, self._root_size(buf))
+
+    @staticmethod
+    def _root_size(buf: memoryview) -> int:
+        """Проверяет заявленный размер корневого документа относительно длины входа."""
+        if len(buf) < 4:
             raise BsonBrokenDataError("Not enough bytes for size")
 
-        size = struct.unpack_from("<i", data)[0]
+        size = STRUCT_INT32.unpack_from(buf)[0]
 
-        if size > len(data) or size < 0:
+        if size > len(buf) or size < 0:
             raise BsonNotEnoughDataError("Not enough data for declared document size")
-        if len(data) < 5:
+        if len(buf) < 5:
             raise BsonIncorrectSizeError("Document size too small")
-        if size < len(data):
+        if size < len(buf):
             raise BsonTooManyDataError("Extra data beyond document size")
         if size < 5:
             raise BsonIncorrectSizeError("Document size too small")
+        return size
+
+    def iter_unmarshal(self, stream: BinaryIO) -> Iterator[dict[str, Any]]:
+        """Читает из бинарного потока подряд записанные BSON-документы, держа в памяти только один."""
+        for doc in self._iter_raw_documents(stream):
+            yield self.unmarshal(doc)
+
+    def _iter_raw_documents(self, stream: BinaryIO) -> Iterator[bytearray]:
+        """Нарезает поток на байты отдельных документов по их 4-байтному префиксу длины."""
+        header = bytearray(4)
+        while True:
+            got = self._read_exact(stream, header)
+            if got == 0:
+                return
+            if got < 4:
+                raise BsonNotEnoughDataError("Not enough bytes for size")
+
+            size = struct.unpack_from("<i", header)[0]
+            if size < 5:
+                raise BsonIncorrectSizeError("Document size too small")
+            if size > MAX_DOCUMENT_SIZE:
+                raise BsonIncorrectSizeError("Document size exceeds MAX_DOCUMENT_SIZE")
+
+            # длина известна из префикса, поэтому читаем ровно один документ
+            doc = bytearray(size)
+            doc[:4] = header
+            with memoryview(doc) as view:
+                if self._read_exact(stream, view[4:]) < size - 4:
+                    raise BsonNotEnoughDataError("Not enough data for declared document size")
+            yield doc
+
+    def unmarshal_columns(self, docs: Iterable[BytesLike] | BinaryIO, schema: dict[str, int]) -> dict[str, Any]:
+        """
+        Разбирает однородные плоские документы сразу в колонки NumPy, не создавая dict на строку.
 
-        # reset parsed types
-        self._parsed_nt_metadata = None
+        docs - последовательность BSON-документов или бинарный поток с ними подряд;
+        schema - поле -> TYPE_INT32 / TYPE_INT64 / TYPE_DOUBLE / TYPE_BOOLEAN / TYPE_DATETIME / TYPE_STRING.
+        Числа копируются байтами прямо в буфер колонки. Отсутствующее или null-значение
+        даёт NaN, NaT или None; для целых и bool это ошибка.
+        """
+        import numpy as np
+
+        for key, typ in schema.items():
+            if typ not in COLUMN_DTYPES:
+                raise MapperConfigError(f"Unsupported column type {typ} for field '{key}'")
+
+        if hasattr(docs, "readinto"):
+            docs = self._iter_raw_documents(docs)
+
+        fixed = {key: bytearray() for key, typ in schema.items() if typ != TYPE_STRING}
+        strings: dict[str, list[str | None]] = {key: [] for key, typ in schema.items() if typ == TYPE_STRING}
+        rows = 0
+
+        for data in docs:
+            with self._as_memoryview(data) as buf:
+                size = self._root_size(buf)
+                found: set[str] = set()
+                pos = 4
+                while pos < size - 1:
+                    element_type = buf[pos]
+                    key, pos = self._read_cstring(buf, pos + 1, size)
+                    value_pos = pos
+                    pos = self._skip_value(element_type, buf, pos, size)
+                    if key not in schema or element_type == TYPE_NULL:
+                        continue
+                    if key in found:
+                        raise BsonRepeatedKeyDataError(f"Repeated key: {key}")
+                    found.add(key)
+
+                    column_type = schema[key]
+                    if column_type == TYPE_STRING and element_type == TYPE_STRING:
+                        strings[key].append(self._parse_supported_value(TYPE_STRING, buf, value_pos, size)[1])
+                    elif element_type == column_type == TYPE_BOOLEAN:
+                        fixed[key].append(1 if buf[value_pos] else 0)
+                    elif element_type == column_type:
+                        fixed[key] += buf[value_pos:pos]
+                    elif column_type == TYPE_INT64 and element_type == TYPE_INT32:
+                        fixed[key] += STRUCT_INT64.pack(STRUCT_INT32.unpack_from(buf, value_pos)[0])
+                    elif column_type == TYPE_DOUBLE and element_type in (TYPE_INT32, TYPE_INT64):
+                        fixed[key] += STRUCT_DOUBLE.pack(self._parse_supported_value(element_type, buf, value_pos, size)[1])
+                    else:
+                        raise BsonInvalidElementTypeError(
+                            f"Field '{key}' has type {element_type}, column expects {column_type}")
+                if pos != size - 1:
+                    raise BsonBrokenDataError("Invalid document length or alignment")
+
+            for key in schema.keys() - found:
+                self._append_missing(key, schema[key], fixed, strings)
+            rows += 1
+
+        columns: dict[str, Any] = {}
+        for key, typ in schema.items():
+            if typ == TYPE_STRING:
+                column = np.empty(rows, dtype=object)
+                column[:] = strings[key]
+            else:
+                column = np.frombuffer(fixed[key], dtype=COLUMN_DTYPES[typ])
+                if typ == TYPE_DATETIME:
+                    column = column.view("datetime64[ms]")
+            columns[key] = column
+        return columns
 
-        _, result, _ = self._parse_document(data, 0, size)
+    @staticmethod
+    def _append_missing(key: str, typ: int, fixed: dict[str, bytearray], strings: dict[str, list[str | None]]) -> None:
+        if typ == TYPE_STRING:
+            strings[key].append(None)
+        elif typ == TYPE_DOUBLE:
+            fixed[key] += STRUCT_DOUBLE.pack(float("nan"))
+        elif typ == TYPE_DATETIME:
+            # минимальное int64 numpy трактует как NaT
+            fixed[key] += STRUCT_INT64.pack(INT64_MIN)
+        else:
+            raise BsonUnmarshalError(f"Field '{key}' is missing and its column has no empty value")
+
+    def marshal_many(self, docs: Iterable[Any], stream: BinaryIO) -> int:
+        """Пишет документы в поток один за другим; возвращает число записанных документов."""
+        count = 0
+        for doc in docs:
+            stream.write(self.marshal(doc))
+            count += 1
+        return count
+
+    def marshal_batch(self, docs: Iterable[Any], workers: int | None = None,
+                      executor: Executor | None = None) -> list[bytes]:
+        """
+        Сериализует пачку документов; результаты идут в порядке входа.
+        Пачки от BATCH_MIN_DOCS документов делятся на куски между workers процессами
+        (по умолчанию os.cpu_count()). Документы и зарегистрированные классы должны пиклиться.
+        С executor куски уходят в него, а не в новый пул на каждый вызов: мапперы воркеров
+        переживают вызовы, workers тогда задаёт только число кусков.
+        """
+        docs = list(docs)
+        if not self._use_workers(len(docs), workers, executor):
+            return [self.marshal(doc) for doc in docs]
+        return self._run_batch(_marshal_chunk, docs, workers, executor)
+
+    def unmarshal_batch(self, blobs: Iterable[BytesLike], workers: int | None = None,
+                        executor: Executor | None = None) -> list[dict[str, Any]]:
+        """
+        Разбирает пачку документов; параллелится так же, как marshal_batch.
+        В процессах-воркерах zero_copy выключен: memoryview-срезы нельзя передать обратно.
+        """
+        blobs = list(blobs)
+        if not self._use_workers(len(blobs), workers, executor):
+            return [self.unmarshal(blob) for blob in blobs]
+        # memoryview и mmap не пиклятся, в воркеры уходят bytes
+        return self._run_batch(_unmarshal_chunk, [bytes(blob) for blob in blobs], workers, executor)
+
+    @staticmethod
+    def _use_workers(count: int, workers: int | None, executor: Executor | None) -> bool:
+        if count < BATCH_MIN_DOCS:
+            return False
+        if executor is not None:
+            return True
+        if workers is None:
+            workers = os.cpu_count() or 1
+        return workers > 1
+
+    def _run_batch(self, func, items: list[Any], workers: int | None, executor: Executor | None) -> list[Any]:
+        workers = workers or os.cpu_count() or 1
+        # по несколько кусков на воркер, чтобы неровные документы не оставляли процессы без работы
+        chunk_size = -(-len(items) // (workers * 4))
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        # memoryview-срезы из другого процесса не вернуть
+        if executor is None or isinstance(executor, ProcessPoolExecutor):
+            config = dict(self._config, zero_copy=False)
+        else:
+            config = self._config
+        classes = tuple(self._plans)
+
+        result = []
+        if executor is not None:
+            for part in executor.map(func, [config] * len(chunks), [classes] * len(chunks), chunks):
+                result.extend(part)
+            return result
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(func, [config] * len(chunks), [classes] * len(chunks), chunks):
+                result.extend(part)
         return result
 
+    async def read_document(self, reader: asyncio.StreamReader, budget: float | None = None,
+                            executor: Executor | None = None) -> Any | None:
+        """
+        Читает из asyncio-потока один документ по его префиксу длины; в конце потока возвращает None.
+        Документ, разбор которого по текущей оценке скорости займёт больше budget секунд
+        (по умолчанию ASYNC_DECODE_BUDGET), разбирается в executor (None - пул потоков loop),
+        чтобы не блокировать event loop.
+        """
+        try:
+            header = await reader.readexactly(4)
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None
+            raise BsonNotEnoughDataError("Not enough bytes for size")
+
+        size = STRUCT_INT32.unpack(header)[0]
+        if size < 5:
+            raise BsonIncorrectSizeError("Document size too small")
+        if size > MAX_DOCUMENT_SIZE:
+            raise BsonIncorrectSizeError("Document size exceeds MAX_DOCUMENT_SIZE")
+        try:
+            data = header + await reader.readexactly(size - 4)
+        except asyncio.IncompleteReadError:
+            raise BsonNotEnoughDataError("Not enough data for declared document size")
+
+        if budget is None:
+            budget = ASYNC_DECODE_BUDGET
+        if size <= budget * _decode_rate:
+            start = time.perf_counter()
+            doc = self.unmarshal(data)
+            _observe_decode_rate(size, time.perf_counter() - start)
+            return doc
+
+        # memoryview-срезы из другого процесса не вернуть
+        config = dict(self._config, zero_copy=False) if isinstance(executor, ProcessPoolExecutor) else self._config
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, _unmarshal_one, config, tuple(self._plans), data)
+
+    async def write_document(self, writer: asyncio.StreamWriter, doc: Any) -> int:
+        """Пишет документ в asyncio-поток и ждёт drain; возвращает число записанных байт."""
+        data = self.marshal(doc)
+        writer.write(data)
+        await writer.drain()
+        return len(data)
+
+    @staticmethod
+    def _read_exact(stream: BinaryIO, buf: bytearray | memoryview) -> int:
+        """Заполняет buf из потока; меньше len(buf) байт возвращается только в конце потока."""
+        got = 0
+        with memoryview(buf) as view:
+            while got < len(view):
+                n = stream.readinto(view[got:])
+                if not n:
+                    break
+                got += n
+        return got
+
+    @staticmethod
+    def _as_memoryview(data: BytesLike) -> memoryview:
+        """Возвращает байтовый memoryview над bytes, bytearray, memoryview или mmap без копирования."""
+        buf = memoryview(data)
+        if buf.format != "B" or buf.ndim != 1:
+            buf = buf.cast("B")
+        return buf
+
     def unmarshal_value(
             self,
             element_type: int,
@@ -588,7 +1592,7 @@ class Mapper:
             pos: int,
             end: int,
             *,
-            metadata_hints: list[str] | None,
+            metadata_hints: Sequence[str] | None,
             nt_id: str | None
     ):
         """
@@ -622,129 +1626,218 @@ class Mapper:
 
         return result
 
-    def _parse_document(self, buf: bytes, pos: int, limit: int) -> tuple[int, dict[str, Any], int]:
-        if pos + 4 > limit:
-            raise BsonBrokenDataError("Not enough bytes for document size")
-
-        doc_size = struct.unpack_from("<i", buf, pos)[0]
-        if doc_size < 0 or pos + doc_size > limit:
-            raise BsonBrokenDataError("Nested document size exceeds parent bounds")
-        if doc_size < 5:
-            raise BsonIncorrectSizeError("Document size too small")
-
-        end = pos + doc_size
+    def _parse_document(self, buf: memoryview, pos: int, limit: int) -> tuple[int, Any, int]:
+        """
+        Разбирает документ с вложенными документами и массивами без рекурсии:
+        состояние родителей лежит на явном стеке, поэтому глубина ограничена только памятью.
+        """
+        start = pos
+        end = self._document_end(buf, pos, limit)
         pos += 4
 
+        keep_types = self.keep_types
+        python_only = self.python_only
+        read_cstring = self._read_cstring
+        unpack_int32 = STRUCT_INT32.unpack_from
+        unpack_int64 = STRUCT_INT64.unpack_from
+        unpack_double = STRUCT_DOUBLE.unpack_from
+
+        # кадры родителей: (start, end, result, seen_keys, hints, nt_id, local_types, self_id, key, is_array)
+        stack: list[tuple] = []
         result: dict[str, Any] = {}
         seen_keys: set[str] = set()
-        metadata_hints: list[str] | None = None
+        metadata_hints: Sequence[str] | None = None
         namedtuple_type_id: str | None = None
         local_types: dict[str, dict] | None = None
         root_self_id: str | None = None
+        frame_key: str | None = None
+        is_array = False
 
-        ALLOWED_PYTHON_TYPES = (
-            TYPE_DOUBLE, TYPE_STRING, TYPE_DOCUMENT, TYPE_ARRAY,
-            TYPE_BINARY, TYPE_BOOLEAN, TYPE_DATETIME, TYPE_NULL,
-            TYPE_INT32, TYPE_INT64
-        )
+        while True:
+            if pos < end - 1:
+                if pos >= limit:
+                    raise BsonBrokenDataError("Unexpected end of data while reading types")
 
-        while pos < end - 1:
-            if pos >= limit:
-                raise BsonBrokenDataError("Unexpected end of data while reading types")
+                element_type = buf[pos]
+                pos += 1
 
-            element_type = buf[pos]
-            pos += 1
+                if python_only and element_type not in PYTHON_ONLY_TYPES:
+                    raise BsonInvalidElementTypeError(f"Type {element_type} invalid for python_only mode")
 
-            if self.python_only and element_type not in ALLOWED_PYTHON_TYPES:
-                raise BsonInvalidElementTypeError(f"Type {element_type} invalid for python_only mode")
+                key, pos = read_cstring(buf, pos, end)
 
-            key, pos = self._read_cstring(buf, pos, end)
+                if element_type == TYPE_BINARY:
+                    is_metadata_key = (key == "__metadata__")
+                    if key == "__type__":
+                        pos, value, subtype = self._parse_binary(buf, pos, end, allow_128=True)
+                        if subtype == SUBTYPE_USER_METADATA:
+                            try:
+                                namedtuple_type_id = str(value, "utf-8")
+                            except Exception:
+                                namedtuple_type_id = None
+                        continue
 
-            is_metadata_key = (key == "__metadata__")
+                    pos, value, subtype = self._parse_binary(buf, pos, end, is_metadata_key)
+
+                    # metadata field handling
+                    if subtype == SUBTYPE_USER_METADATA and is_metadata_key:
+                        # if payload starts with 0x00 => new format with embedded BSON doc
+                        if len(value) > 0 and value[0] == 0:
+                            payload = value[1:]
+                            # вложенный разбор не рекурсивен: у документа метаданных нет своих __metadata__
+                            try:
+                                _, meta_doc, _ = self._parse_document(payload, 0, len(payload))
+                            except Exception:
+                                raise BsonBadStringDataError("Invalid metadata BSON")
+                            # meta_doc may contain 'types' (dict), 'children' (str), 'self' (str)
+                            if isinstance(meta_doc, dict):
+                                if "types" in meta_doc and isinstance(meta_doc["types"], dict):
+                                    local_types = meta_doc["types"]
+                                if "children" in meta_doc and isinstance(meta_doc["children"], str):
+                                    metadata_hints = meta_doc["children"].split(":") if meta_doc["children"] else []
+                                if "self" in meta_doc and isinstance(meta_doc["self"], str):
+                                    root_self_id = meta_doc["self"]
+                        elif len(value) > 0 and value[0] == METADATA_RUNS:
+                            metadata_hints = self._decode_hint_runs(value, end - start)
+                        else:
+                            # old format: colon-separated hints string
+                            try:
+                                metadata_str = str(value, "utf-8")
+                            except UnicodeDecodeError:
+                                raise BsonBadStringDataError("Invalid UTF-8 in metadata")
+                            metadata_hints = metadata_str.split(":") if metadata_str else []
+                        continue
 
-            if key == "__type__" and element_type == TYPE_BINARY:
-                pos, value, subtype = self._parse_binary(buf, pos, end, allow_128=True)
-                if subtype == SUBTYPE_USER_METADATA:
-                    try:
-                        namedtuple_type_id = value.decode("utf-8")
-                    except Exception:
-                        namedtuple_type_id = None
-                continue
+                    # if not metadata (or metadata but not processed above), add binary value
+                    if value is not None:
+                        if key in seen_keys:
+                            raise BsonRepeatedKeyDataError(f"Repeated key: {key}")
+                        seen_keys.add(key)
+                        result[key] = value
+
+                elif element_type == TYPE_STRING and key == "self":
+                    # special root self marker (string)
+                    size = unpack_int32(buf, pos)[0]
+                    pos += 4
+                    root_self_id = str(buf[pos:pos + size - 1], "utf-8")
+                    pos += size
+                    continue
 
-            # special root self marker (string)
-            if key == "self" and element_type == TYPE_STRING:
-                size = struct.unpack_from("<i", buf, pos)[0]
-                pos += 4
-                root_self_id = buf[pos:pos + size - 1].decode("utf-8")
-                pos += size
-                continue
+                else:
+                    if key in seen_keys:
+                        raise BsonRepeatedKeyDataError(f"Repeated key: {key}")
+                    seen_keys.add(key)
 
-            if element_type == TYPE_BINARY:
-                pos, value, subtype = self._parse_binary(buf, pos, end, is_metadata_key)
-
-                # metadata field handling
-                if subtype == SUBTYPE_USER_METADATA and is_metadata_key:
-                    # if payload starts with 0x00 => new format with embedded BSON doc
-                    if len(value) > 0 and value[0] == 0:
-                        payload = value[1:]
-                        # parse payload as BSON document
-                        try:
-                            _, meta_doc, _ = self._parse_document(payload, 0, len(payload))
-                        except Exception:
-                            raise BsonBadStringDataError("Invalid metadata BSON")
-                        # meta_doc may contain 'types' (dict), 'children' (str), 'self' (str)
-                        if isinstance(meta_doc, dict):
-                            if "types" in meta_doc and isinstance(meta_doc["types"], dict):
-                                local_types = meta_doc["types"]
-                            if "children" in meta_doc and isinstance(meta_doc["children"], str):
-                                metadata_hints = meta_doc["children"].split(":") if meta_doc["children"] else []
-                            if "self" in meta_doc and isinstance(meta_doc["self"], str):
-                                root_self_id = meta_doc["self"]
+                    if element_type == TYPE_DOCUMENT or element_type == TYPE_ARRAY:
+                        # вместо рекурсии откладываем текущий документ на стек и начинаем вложенный
+                        child_end = self._document_end(buf, pos, end)
+                        if element_type == TYPE_ARRAY and child_end - pos >= 4 * ARRAY_BULK_MIN:
+                            value = self._parse_fixed_array(buf, pos, child_end)
+                            if value is not None:
+                                if keep_types:
+                                    value = self._apply_parent_metadata(value, metadata_hints, namedtuple_type_id)
+                                result[key] = value
+                                pos = child_end
+                                continue
+                        stack.append((start, end, result, seen_keys, metadata_hints, namedtuple_type_id,
+                                      local_types, root_self_id, frame_key, is_array))
+                        start, end = pos, child_end
+                        pos += 4
+                        result = {}
+                        seen_keys = set()
+                        metadata_hints = namedtuple_type_id = local_types = root_self_id = None
+                        frame_key = key
+                        is_array = element_type == TYPE_ARRAY
                         continue
-                    else:
-                        # old format: colon-separated hints string
+
+                    if element_type == TYPE_STRING:
+                        size = unpack_int32(buf, pos)[0]
+                        pos += 4
+                        if size < 1:
+                            raise BsonStringSizeError("Invalid string size")
+                        if pos + size > end - 1:
+                            raise BsonInconsistentStringSizeError("String exceeds bounds")
+                        if buf[pos + size - 1] != 0:
+                            raise BsonBrokenDataError("Missing string terminator")
                         try:
-                            metadata_str = value.decode("utf-8")
+                            value = str(buf[pos:pos + size - 1], "utf-8")
                         except UnicodeDecodeError:
-                            raise BsonBadStringDataError("Invalid UTF-8 in metadata")
-                        metadata_hints = metadata_str.split(":") if metadata_str else []
+                            raise BsonBadStringDataError("Invalid UTF-8 in string")
+                        pos += size
+                    elif element_type == TYPE_INT32:
+                        value = unpack_int32(buf, pos)[0]
+                        pos += 4
+                    elif element_type == TYPE_INT64:
+                        value = unpack_int64(buf, pos)[0]
+                        pos += 8
+                    elif element_type == TYPE_DOUBLE:
+                        value = unpack_double(buf, pos)[0]
+                        pos += 8
+                    elif element_type == TYPE_BOOLEAN:
+                        value = buf[pos] != 0
+                        pos += 1
+                    elif element_type == TYPE_NULL:
+                        value = None
+                    elif element_type == TYPE_DATETIME:
+                        value = EPOCH + datetime.timedelta(milliseconds=unpack_int64(buf, pos)[0])
+                        pos += 8
+                    else:
+                        pos = self._skip_known_type(element_type, buf, pos, end)
+                        if pos > end:
+                            raise BsonBrokenDataError("Element overshoots document")
                         continue
 
-                # if not metadata (or metadata but not processed above), add binary value
-                if value is not None:
-                    if key in seen_keys:
-                        raise BsonRepeatedKeyDataError(f"Repeated key: {key}")
-                    seen_keys.add(key)
-                    result[key] = value
-            else:
-                if key in seen_keys:
-                    raise BsonRepeatedKeyDataError(f"Repeated key: {key}")
-                seen_keys.add(key)
-
-                if element_type in (TYPE_NULL, TYPE_BOOLEAN, TYPE_INT32, TYPE_INT64,
-                                    TYPE_DOUBLE, TYPE_STRING, TYPE_DOCUMENT, TYPE_ARRAY, TYPE_DATETIME):
-                    pos, value = self.unmarshal_value(
-                        element_type,
-                        key,
-                        buf,
-                        pos,
-                        end,
-                        metadata_hints=metadata_hints,
-                        nt_id=namedtuple_type_id,
-                    )
+                    if keep_types:
+                        value = self._apply_parent_metadata(value, metadata_hints, namedtuple_type_id)
                     result[key] = value
 
-                else:
-                    pos = self._skip_known_type(element_type, buf, pos, end)
+                if pos > end:
+                    raise BsonBrokenDataError("Element overshoots document")
+                continue
 
-            if pos > end:
-                raise BsonBrokenDataError("Element overshoots document")
+            # документ закончился: проверяем хвост и собираем значение
+            if pos != end - 1:
+                raise BsonBrokenDataError("Invalid document length or alignment")
+            if buf[pos] != 0:
+                raise BsonBrokenDataError("Missing final zero byte")
+            value = self._finish_document(result, metadata_hints, namedtuple_type_id, local_types, root_self_id)
+            pos = end
+
+            if not stack:
+                return end, value, end
+
+            if is_array:
+                value = self._array_from_document(value)
+            key = frame_key
+            (start, end, result, seen_keys, metadata_hints, namedtuple_type_id,
+             local_types, root_self_id, frame_key, is_array) = stack.pop()
+            if keep_types:
+                value = self._apply_parent_metadata(value, metadata_hints, namedtuple_type_id)
+            result[key] = value
 
-        if pos != end - 1:
-            raise BsonBrokenDataError("Invalid document length or alignment")
-        if buf[pos] != 0:
-            raise BsonBrokenDataError("Missing final zero byte")
+    @staticmethod
+    def _document_end(buf: memoryview, pos: int, limit: int) -> int:
+        if pos + 4 > limit:
+            raise BsonBrokenDataError("Not enough bytes for document size")
+
+        doc_size = STRUCT_INT32.unpack_from(buf, pos)[0]
+        if doc_size < 0 or pos + doc_size > limit:
+            raise BsonBrokenDataError("Nested document size exceeds parent bounds")
+        if doc_size < 5:
+            raise BsonIncorrectSizeError("Document size too small")
+        return pos + doc_size
+
+    def _apply_parent_metadata(self, value: Any, metadata_hints: Sequence[str] | None, nt_id: str | None) -> Any:
+        """То же, что unmarshal_value делает после разбора: подсказки и namedtuple-тип родителя."""
+        if metadata_hints:
+            value = self.apply_metadata(value, metadata_hints)
+        if nt_id:
+            value = self.apply_namedtuple_metadata(value, nt_id)
+        return value
 
+    def _finish_document(self, result: dict[str, Any], metadata_hints: Sequence[str] | None,
+                         namedtuple_type_id: str | None, local_types: dict[str, dict] | None,
+                         root_self_id: str | None) -> Any:
         # If we found local types (new format), save them into parsed metadata for this mapper
         if local_types:
             # local_types should be a mapping nt-id -> {name, fields, defaults}
@@ -766,12 +1859,11 @@ class Mapper:
             meta_source = self._parsed_nt_metadata or self._nt_metadata
             meta = meta_source.get(namedtuple_type_id) if meta_source else None
             if meta:
-                from collections import namedtuple
                 name = meta.get("name", "NT")
                 fields = list(meta.get("fields", []))
                 defaults = meta.get("defaults", {}) or {}
                 try:
-                    NT = namedtuple(name, fields)
+                    NT = self._nt_classes.get(name, fields, defaults)
                     # prepare kwargs from result
                     kwargs = {}
                     for f in fields:
@@ -779,7 +1871,7 @@ class Mapper:
                             kwargs[f] = result[f]
                         else:
                             kwargs[f] = defaults.get(f)
-                    return end, NT(**kwargs), end
+                    return NT(**kwargs)
                 except Exception:
                     pass  # fallback to dict
 
@@ -787,12 +1879,11 @@ class Mapper:
         if self.keep_types and self._parsed_nt_metadata and root_self_id:
             meta = self._parsed_nt_metadata.get(root_self_id)
             if meta:
-                from collections import namedtuple
                 name = meta.get("name", "NT")
                 fields = list(meta.get("fields", []))
                 defaults = meta.get("defaults", {}) or {}
                 try:
-                    NT = namedtuple(name, fields)
+                    NT = self._nt_classes.get(name, fields, defaults)
                     kwargs = {}
                     for f in fields:
                         if f in result:
@@ -802,7 +1893,7 @@ class Mapper:
                     # clear parsed metadata after reconstructing root to avoid leaking into siblings
                     parsed_saved = self._parsed_nt_metadata
                     self._parsed_nt_metadata = None
-                    return end, NT(**kwargs), end
+                    return NT(**kwargs)
                 except Exception:
                     pass
 
@@ -812,9 +1903,229 @@ class Mapper:
         if not local_types:
             self._parsed_nt_metadata = None
 
-        return end, result, end
+        return result
+
+    @staticmethod
+    def _parse_fixed_array(buf: memoryview, start: int, end: int) -> list[Any] | None:
+        """
+        Разбирает массив из элементов одного типа фиксированной ширины целиком через struct.iter_unpack.
+        Ключи "0", "1", ... одной длины дают записи одного размера, поэтому число элементов
+        выводится из длины тела. Возвращает None, если раскладка не совпала; тогда массив
+        разбирается общим путём, который и сообщит об ошибке в данных.
+        """
+        body, body_end = start + 4, end - 1
+        element_type = buf[body]
+        if element_type not in _FIXED_ARRAY_FORMATS or buf[body_end] != 0:
+            return None
+        # запись с однозначным ключом: тип, цифра, \x00 и значение
+        width = _fixed_record(1, element_type).size - 3
+
+        # группы ключей по числу цифр: 10 однозначных, 90 двузначных, ...
+        groups = []
+        remaining, digits, group, count = body_end - body, 1, 10, 0
+        while remaining > 0:
+            record = digits + 2 + width
+            if remaining <= group * record:
+                if remaining % record:
+                    return None
+                group = remaining // record
+            groups.append((digits, group))
+            remaining -= group * record
+            count += group
+            digits, group = digits + 1, group * 10 if digits > 1 else 90
+
+        keys = _index_keys(count)
+        values: list[Any] = []
+        pos, index = body, 0
+        for digits, group in groups:
+            record = _fixed_record(digits, element_type)
+            size = group * record.size
+            types, group_keys, group_values = zip(*record.iter_unpack(buf[pos:pos + size]))
+            if types.count(element_type) != group or list(group_keys) != keys[index:index + group]:
+                return None
+            values += group_values
+            pos += size
+            index += group
+
+        if element_type == TYPE_DATETIME:
+            delta = datetime.timedelta
+            return [EPOCH + delta(milliseconds=ms) for ms in values]
+        return values
+
+    def _array_from_document(self, doc: Any) -> list[Any]:
+        indices = []
+        for k in doc:
+            if not k.isdigit():
+                raise BsonBadArrayIndexError(f"Non-numeric array index: {k}")
+            i = int(k)
+            if str(i) != k:
+                raise BsonBadArrayIndexError(f"Non-canonical array index '{k}'")
+            indices.append(i)
+
+        if not indices:
+            return []
+
+        max_idx = max(indices)
+
+        if self.python_only:
+            if max_idx != len(indices) - 1:
+                raise BsonInvalidArrayError("Array indices have gaps or do not start from 0")
+
+        arr = [None] * (max_idx + 1)
+        for k, v in doc.items():
+            arr[int(k)] = v
+
+        # If the array document had metadata hints, they were already applied inside nested _parse_document
+        # because nested document applies metadata to its own values. So arr elements should already be typed.
+
+        return arr
+
+    @staticmethod
+    def _fields_tree(fields: Iterable[str]) -> dict[str, Any]:
+        """Строит дерево путей: ["a.b", "c"] -> {"a": {"b": None}, "c": None}; None - значение целиком."""
+        tree: dict[str, Any] = {}
+        for path in fields:
+            parts = path.split(".")
+            node = tree
+            for part in parts[:-1]:
+                if part in node and node[part] is None:
+                    break
+                node = node.setdefault(part, {})
+            else:
+                node[parts[-1]] = None
+        return tree
+
+    def _scan_root_types(self, buf: memoryview, size: int) -> dict[str, dict] | None:
+        """Находит в корне метаданные namedtuple-типов, пропуская остальные элементы по длине."""
+        pos, nt_types = 4, None
+        while pos < size - 1:
+            element_type = buf[pos]
+            key, pos = self._read_cstring(buf, pos + 1, size)
+            value_pos = pos
+            pos = self._skip_value(element_type, buf, pos, size)
+            if element_type == TYPE_BINARY and key == "__metadata__" and buf[value_pos + 4] == SUBTYPE_USER_METADATA:
+                _, value, _ = self._parse_binary(buf, value_pos, size, True)
+                nt_types = self._parse_metadata(value, size)[0] or nt_types
+        return nt_types
+
+    def _parse_metadata(self, value: memoryview, size: int) -> tuple[dict[str, dict] | None, Sequence[str] | None]:
+        """
+        Разбирает payload __metadata__; возвращает (types, hints) в новом или старом формате.
+        size - длина документа, которому принадлежат метаданные.
+        """
+        if len(value) > 0 and value[0] == 0:
+            try:
+                _, meta_doc, _ = Mapper()._parse_document(value[1:], 0, len(value) - 1)
+            except Exception:
+                raise BsonBadStringDataError("Invalid metadata BSON")
+            nt_types = meta_doc["types"] if isinstance(meta_doc.get("types"), dict) else None
+            hints = None
+            if isinstance(meta_doc.get("children"), str):
+                hints = meta_doc["children"].split(":") if meta_doc["children"] else []
+            return nt_types, hints
+        if len(value) > 0 and value[0] == METADATA_RUNS:
+            return None, self._decode_hint_runs(value, size)
+        try:
+            metadata_str = str(value, "utf-8")
+        except UnicodeDecodeError:
+            raise BsonBadStringDataError("Invalid UTF-8 in metadata")
+        return None, metadata_str.split(":") if metadata_str else []
+
+    def _parse_projected(self, buf: memoryview, pos: int, limit: int, tree: dict[str, Any],
+                         nt_types: dict[str, dict] | None) -> tuple[int, dict[str, Any]]:
+        """Разбирает из документа только ключи из tree; возвращает (позиция за документом, результат)."""
+        if pos + 4 > limit:
+            raise BsonBrokenDataError("Not enough bytes for document size")
+        doc_size = STRUCT_INT32.unpack_from(buf, pos)[0]
+        if doc_size < 0 or pos + doc_size > limit:
+            raise BsonBrokenDataError("Nested document size exceeds parent bounds")
+        if doc_size < 5:
+            raise BsonIncorrectSizeError("Document size too small")
+
+        end = pos + doc_size
+        pos += 4
+        result: dict[str, Any] = {}
+        seen_keys: set[str] = set()
+        # ключ -> порядковый номер среди значений документа, по нему применяются type-hint'ы
+        whole_values: dict[str, int] = {}
+        metadata_hints: Sequence[str] | None = None
+        ordinal = 0
+
+        while pos < end - 1:
+            element_type = buf[pos]
+            pos += 1
+
+            if self.python_only and element_type not in PYTHON_ONLY_TYPES:
+                raise BsonInvalidElementTypeError(f"Type {element_type} invalid for python_only mode")
+
+            key, pos = self._read_cstring(buf, pos, end)
+            value_pos = pos
+            pos = self._skip_value(element_type, buf, pos, end)
+
+            if element_type == TYPE_BINARY and (key == "__type__" or buf[value_pos + 4] != 0):
+                allow_128 = key in ("__metadata__", "__type__")
+                _, value, subtype = self._parse_binary(buf, value_pos, end, allow_128)
+                if key == "__metadata__" and subtype == SUBTYPE_USER_METADATA:
+                    metadata_hints = self._parse_metadata(value, doc_size)[1] or metadata_hints
+                continue
+            if element_type not in PYTHON_ONLY_TYPES or (key == "self" and element_type == TYPE_STRING):
+                continue
+
+            if key in seen_keys:
+                raise BsonRepeatedKeyDataError(f"Repeated key: {key}")
+            seen_keys.add(key)
+            ordinal += 1
+
+            if key not in tree:
+                continue
+            subtree = tree[key]
+            if subtree is None:
+                whole_values[key] = ordinal - 1
+                if element_type == TYPE_BINARY:
+                    _, result[key], _ = self._parse_binary(buf, value_pos, end, False)
+                else:
+                    self._parsed_nt_metadata = nt_types
+                    _, result[key] = self._parse_supported_value(element_type, buf, value_pos, end)
+            elif element_type == TYPE_DOCUMENT:
+                _, result[key] = self._parse_projected(buf, value_pos, end, subtree, nt_types)
+            elif element_type == TYPE_ARRAY:
+                _, result[key] = self._parse_projected_array(buf, value_pos, end, subtree, nt_types)
+
+        if pos != end - 1:
+            raise BsonBrokenDataError("Invalid document length or alignment")
+        if buf[pos] != 0:
+            raise BsonBrokenDataError("Missing final zero byte")
 
-    def _parse_binary(self, buf: bytes, pos: int, limit: int, allow_128: bool) -> tuple[int, Any, int]:
+        if self.keep_types and metadata_hints:
+            for key, index in whole_values.items():
+                if index < len(metadata_hints) and metadata_hints[index]:
+                    self._parsed_nt_metadata = nt_types
+                    result[key] = self._apply_type_hint(result[key], metadata_hints[index])
+        return end, result
+
+    def _parse_projected_array(self, buf: memoryview, pos: int, limit: int, tree: dict[str, Any],
+                               nt_types: dict[str, dict] | None) -> tuple[int, list[Any]]:
+        """Путь внутрь массива применяется к каждому элементу-документу, как проекция в MongoDB."""
+        doc_size = STRUCT_INT32.unpack_from(buf, pos)[0]
+        end = pos + doc_size
+        pos += 4
+        result: list[Any] = []
+        while pos < end - 1:
+            element_type = buf[pos]
+            _, pos = self._read_cstring(buf, pos + 1, end)
+            if element_type == TYPE_DOCUMENT:
+                pos, value = self._parse_projected(buf, pos, end, tree, nt_types)
+                result.append(value)
+            elif element_type == TYPE_ARRAY:
+                pos, value = self._parse_projected_array(buf, pos, end, tree, nt_types)
+                result.append(value)
+            else:
+                pos = self._skip_value(element_type, buf, pos, end)
+        if pos != end - 1 or buf[pos] != 0:
+            raise BsonBrokenDataError("Invalid document length or alignment")
+        return end, result
+
+    def _parse_binary(self, buf: memoryview, pos: int, limit: int, allow_128: bool) -> tuple[int, Any, int]:
         length = struct.unpack_from("<i", buf, pos)[0]
         pos += 4
         if length < 0:
@@ -834,17 +2145,18 @@ class Mapper:
         pos += length
 
         if subtype == 0:
-            return pos, bytes(payload), subtype
+            return pos, (payload if self.zero_copy else bytes(payload)), subtype
 
+        # метаданные разбираются тут же, копия им не нужна
         if subtype == SUBTYPE_USER_METADATA and allow_128:
-            return pos, bytes(payload), subtype
+            return pos, payload, subtype
 
         if 1 <= subtype <= 9 or subtype >= 128:
             return pos, None, subtype
 
         raise BsonInvalidBinarySubtypeError(f"Bad subtype {subtype}")
 
-    def _parse_supported_value(self, typ: int, buf: bytes, pos: int, limit: int) -> tuple[int, Any]:
+    def _parse_supported_value(self, typ: int, buf: memoryview, pos: int, limit: int) -> tuple[int, Any]:
         if typ == TYPE_NULL:
             return pos, None
         if typ == TYPE_BOOLEAN:
@@ -866,7 +2178,7 @@ class Mapper:
             if buf[pos + size - 1] != 0:
                 raise BsonBrokenDataError("Missing string terminator")
             try:
-                value = buf[pos:pos + size - 1].decode("utf-8")
+                value = str(buf[pos:pos + size - 1], "utf-8")
             except UnicodeDecodeError:
                 raise BsonBadStringDataError("Invalid UTF-8 in string")
             return pos + size, value
@@ -877,32 +2189,7 @@ class Mapper:
 
         if typ == TYPE_ARRAY:
             _, doc, pos = self._parse_document(buf, pos, limit)
-            indices = []
-            for k in doc:
-                if not k.isdigit():
-                    raise BsonBadArrayIndexError(f"Non-numeric array index: {k}")
-                i = int(k)
-                if str(i) != k:
-                    raise BsonBadArrayIndexError(f"Non-canonical array index '{k}'")
-                indices.append(i)
-
-            if not indices:
-                return pos, []
-
-            max_idx = max(indices)
-
-            if self.python_only:
-                if max_idx != len(indices) - 1:
-                    raise BsonInvalidArrayError("Array indices have gaps or do not start from 0")
-
-            arr = [None] * (max_idx + 1)
-            for k, v in doc.items():
-                arr[int(k)] = v
-
-            # If the array document had metadata hints, they were already applied inside nested _parse_document
-            # because nested document applies metadata to its own values. So arr elements should already be typed.
-
-            return pos, arr
+            return pos, self._array_from_document(doc)
 
         if typ == TYPE_DATETIME:
             ms = struct.unpack_from("<q", buf, pos)[0]
@@ -911,19 +2198,64 @@ class Mapper:
 
         raise BsonInvalidElementTypeError(f"Invalid type {typ}")
 
-    def _read_cstring(self, buf: bytes, pos: int, limit: int) -> tuple[str, int]:
-        start = pos
-        while pos < limit:
-            if buf[pos] == 0:
-                raw = buf[start:pos]
-                try:
-                    return raw.decode("utf-8"), pos + 1
-                except UnicodeDecodeError:
-                    raise BsonBadKeyDataError("Invalid UTF-8 in key")
-            pos += 1
-        raise BsonBadKeyDataError("Missing zero terminator in key")
+    def _read_cstring(self, buf: memoryview, pos: int, limit: int) -> tuple[str, int]:
+        # нулевой байт ищем через bytes.find по окну, а не побайтово; окно растёт для длинных ключей
+        end = min(pos + KEY_SCAN_WINDOW, limit)
+        while True:
+            chunk = bytes(buf[pos:end])
+            size = chunk.find(0)
+            if size >= 0:
+                break
+            if end >= limit:
+                raise BsonBadKeyDataError("Missing zero terminator in key")
+            end = min(pos + 2 * (end - pos), limit)
+
+        raw = chunk[:size]
+        key = _KEY_STRS.get(raw)
+        if key is None:
+            try:
+                key = sys.intern(str(raw, "utf-8"))
+            except UnicodeDecodeError:
+                raise BsonBadKeyDataError("Invalid UTF-8 in key")
+            if len(_KEY_STRS) >= KEY_CACHE_SIZE:
+                _KEY_STRS.clear()
+            _KEY_STRS[raw] = key
+        return key, pos + size + 1
+
+    def _skip_value(self, typ: int, buf: memoryview, pos: int, limit: int) -> int:
+        """Пропускает значение по его заголовку, не создавая Python-объектов; возвращает позицию за ним."""
+        if typ == TYPE_NULL:
+            return pos
+        if typ == TYPE_BOOLEAN:
+            size = 1
+        elif typ == TYPE_INT32:
+            size = 4
+        elif typ in (TYPE_INT64, TYPE_DOUBLE, TYPE_DATETIME):
+            size = 8
+        elif typ in (TYPE_STRING, TYPE_BINARY, TYPE_DOCUMENT, TYPE_ARRAY):
+            if pos + 4 > limit:
+                raise BsonBrokenDataError("Not enough bytes for element size")
+            length = STRUCT_INT32.unpack_from(buf, pos)[0]
+            if typ == TYPE_STRING:
+                if length < 1:
+                    raise BsonStringSizeError("Invalid string size")
+                size = 4 + length
+            elif typ == TYPE_BINARY:
+                if length < 0:
+                    raise BsonBrokenDataError("Negative binary size")
+                size = 5 + length
+            else:
+                if length < 5:
+                    raise BsonIncorrectSizeError("Document size too small")
+                size = length
+        else:
+            return self._skip_known_type(typ, buf, pos, limit)
+
+        if pos + size > limit:
+            raise BsonBrokenDataError("Element overshoots document")
+        return pos + size
 
-    def _skip_known_type(self, typ: int, buf: bytes, pos: int, limit: int) -> int:
+    def _skip_known_type(self, typ: int, buf: memoryview, pos: int, limit: int) -> int:
         if typ in (0x06, 0x0A, 0xFF, 0x7F):
             return pos
 
@@ -952,7 +2284,7 @@ class Mapper:
             if buf[pos + size - 1] != 0:
                 raise BsonBrokenDataError("Missing string terminator")
             try:
-                buf[pos:pos + size - 1].decode("utf-8")
+                str(buf[pos:pos + size - 1], "utf-8")
             except UnicodeDecodeError:
                 raise BsonBadStringDataError("Invalid UTF-8")
             return pos + size
@@ -965,7 +2297,7 @@ class Mapper:
                 if pos >= limit:
                     raise BsonBadStringDataError("Regex missing terminator")
                 try:
-                    buf[start:pos].decode("utf-8")
+                    str(buf[start:pos], "utf-8")
                 except UnicodeDecodeError:
                     raise BsonBadStringDataError("Invalid UTF-8 in regex")
                 pos += 1
@@ -981,7 +2313,7 @@ class Mapper:
             if buf[pos + size - 1] != 0:
                 raise BsonBrokenDataError("Missing DBPointer string terminator")
             try:
-                buf[pos:pos + size - 1].decode("utf-8")
+                str(buf[pos:pos + size - 1], "utf-8")
             except UnicodeDecodeError:
                 raise BsonBadStringDataError("Invalid UTF-8 in DBPointer")
             pos += size
@@ -1015,7 +2347,7 @@ class Mapper:
             if buf[pos + str_size - 1] != 0:
                 raise BsonBrokenDataError("Missing JS code terminator")
             try:
-                buf[pos:pos + str_size - 1].decode("utf-8")
+                str(buf[pos:pos + str_size - 1], "utf-8")
             except UnicodeDecodeError:
                 raise BsonBadStringDataError("Invalid UTF-8 in JS code")
 
@@ -1029,6 +2361,286 @@ class Mapper:
                 raise BsonInconsistentStringSizeError("Scope document exceeds bounds")
             return pos + doc_size
         raise BsonInvalidElementTypeError(f"Unsupported BSON type {typ}")
+
+
+class LazyDocument(Mapping):
+    """
+    Ленивое представление BSON-документа поверх memoryview.
+
+    При первом обращении строится индекс ключей верхнего уровня: ключ -> (тип, смещение значения).
+    Значение разбирается только при доступе к нему и кэшируется; вложенные документы без type-hint'ов
+    возвращаются как LazyDocument (без восстановления namedtuple по __type__, его делает to_dict).
+    Ошибки в данных значения возникают при его разборе, а не при построении индекса.
+    """
+
+    def __init__(self, mapper: Mapper, buf: memoryview, start: int, end: int,
+                 nt_types: dict[str, dict] | None = None):
+        self._mapper = mapper
+        self._buf = buf
+        self._start = start
+        self._end = end
+        # типы от родителя; _nt_types заменяется метаданными самого документа при построении индекса
+        self._parent_nt_types = nt_types
+        self._nt_types = nt_types
+        self._hints: Sequence[str] | None = None
+        self._index: dict[str, tuple[int, int, int]] | None = None
+        self._values: dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._values:
+            return self._values[key]
+        typ, pos, ordinal = self._get_index()[key]
+        value = self._decode(typ, pos, ordinal)
+        self._values[key] = value
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._get_index())
+
+    def __len__(self) -> int:
+        return len(self._get_index())
+
+    def __repr__(self) -> str:
+        return f"LazyDocument({list(self._get_index())})"
+
+    def to_dict(self) -> Any:
+        """
+        Разбирает документ целиком тем же путём, что и Mapper.unmarshal, поэтому вложенные документы
+        восстанавливаются так же, включая namedtuple по __type__; для корня результат совпадает с unmarshal.
+        """
+        mapper = self._mapper
+        mapper._parsed_nt_metadata = self._parent_nt_types
+        _, value, _ = mapper._parse_document(self._buf, self._start, self._end)
+        return value
+
+    def _get_index(self) -> dict[str, tuple[int, int, int]]:
+        if self._index is None:
+            self._index = self._build_index()
+        return self._index
+
+    def _build_index(self) -> dict[str, tuple[int, int, int]]:
+        mapper, buf, end = self._mapper, self._buf, self._end
+        index: dict[str, tuple[int, int, int]] = {}
+        pos = self._start + 4
+
+        while pos < end - 1:
+            element_type = buf[pos]
+            pos += 1
+
+            if mapper.python_only and element_type not in PYTHON_ONLY_TYPES:
+                raise BsonInvalidElementTypeError(f"Type {element_type} invalid for python_only mode")
+
+            key, pos = mapper._read_cstring(buf, pos, end)
+            value_pos = pos
+            pos = mapper._skip_value(element_type, buf, pos, end)
+
+            if element_type == TYPE_BINARY:
+                subtype = buf[value_pos + 4]
+                if key == "__type__" or subtype != 0:
+                    # служебные и неподдерживаемые подтипы в документ не попадают, как и в _parse_document
+                    allow_128 = key in ("__metadata__", "__type__")
+                    _, value, subtype = mapper._parse_binary(buf, value_pos, end, allow_128)
+                    if subtype == SUBTYPE_USER_METADATA and key == "__metadata__":
+                        self._read_metadata(value)
+                    continue
+            elif element_type not in PYTHON_ONLY_TYPES:
+                continue
+            elif key == "self" and element_type == TYPE_STRING:
+                continue
+
+            if key in index:
+                raise BsonRepeatedKeyDataError(f"Repeated key: {key}")
+            index[key] = (element_type, value_pos, len(index))
+
+        if pos != end - 1:
+            raise BsonBrokenDataError("Invalid document length or alignment")
+        if buf[pos] != 0:
+            raise BsonBrokenDataError("Missing final zero byte")
+        return index
+
+    def _read_metadata(self, value: memoryview) -> None:
+        nt_types, hints = self._mapper._parse_metadata(value, self._end - self._start)
+        if nt_types is not None:
+            self._nt_types = nt_types
+        if hints is not None:
+            self._hints = hints
+
+    def _decode(self, typ: int, pos: int, ordinal: int) -> Any:
+        mapper = self._mapper
+        hint = ""
+        if mapper.keep_types and self._hints and ordinal < len(self._hints):
+            hint = self._hints[ordinal]
+
+        if typ == TYPE_DOCUMENT and not hint:
+            size = STRUCT_INT32.unpack_from(self._buf, pos)[0]
+            return LazyDocument(mapper, self._buf, pos, pos + size, self._nt_types)
+
+        if typ == TYPE_BINARY:
+            _, value, _ = mapper._parse_binary(self._buf, pos, self._end, False)
+        else:
+            mapper._parsed_nt_metadata = self._nt_types
+            _, value = mapper._parse_supported_value(typ, self._buf, pos, self._end)
+
+        if hint:
+            # вложенный _parse_document мог сбросить типы, поэтому выставляем их заново
+            mapper._parsed_nt_metadata = self._nt_types
+            value = mapper._apply_type_hint(value, hint)
+        return value
+
+
+class BsonFile(Sequence):
+    """
+    Файл из подряд записанных BSON-документов с произвольным доступом через mmap.
+
+    При открытии префиксы длин один раз просматриваются и строится индекс смещений
+    (или читается sidecar-файл path + ".idx", если размер, время изменения и inode файла данных
+    совпали с записанными в нём).
+    file[i], срезы и len() работают за O(1) по индексу; документ разбирается Mapper.unmarshal
+    прямо над срезом отображения, без чтения файла в память. С zero_copy=True бинарные
+    значения ссылаются на отображение, и close() возможен только после их освобождения.
+    """
+
+    def __init__(self, path: str | os.PathLike, mapper: Mapper | None = None,
+                 index_path: str | os.PathLike | None = None, save_index: bool = False):
+        self.path = os.fspath(path)
+        self.index_path = os.fspath(index_path) if index_path is not None else self.path + ".idx"
+        self._mapper = mapper or Mapper()
+        self._index_map: mmap.mmap | None = None
+
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._size = stat.st_size
+            self._mtime_ns, self._inode = stat.st_mtime_ns, stat.st_ino
+            # mmap не отображает пустые файлы
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+        self._view = memoryview(self._map) if self._map is not None else memoryview(b"")
+
+        self._offsets = self._load_index()
+        if self._offsets is None:
+            try:
+                self._offsets = self._scan()
+            except BsonError:
+                self._offsets = array("q", [0])
+                self.close()
+                raise
+            if save_index:
+                self.save_index()
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int | slice) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("BsonFile index out of range")
+        return self._mapper.unmarshal(self._view[self._offsets[index]:self._offsets[index + 1]])
+
+    def __enter__(self) -> "BsonFile":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+        self._view.release()
+        for m in (self._map, self._index_map):
+            if m is not None:
+                m.close()
+
+    def save_index(self, index_path: str | os.PathLike | None = None) -> None:
+        """Пишет индекс смещений в sidecar-файл, чтобы следующее открытие обошлось без просмотра данных."""
+        target = os.fspath(index_path) if index_path is not None else self.index_path
+        if self._index_map is not None and target == self.index_path:
+            # индекс и так прочитан из этого файла; перезапись отображённого файла небезопасна
+            return
+        with open(target, "wb") as f:
+            f.write(STRUCT_INDEX_HEADER.pack(INDEX_MAGIC, self._size, self._mtime_ns, self._inode, len(self)))
+            f.write(self._offsets.tobytes())
+
+    def _scan(self) -> "array[int]":
+        """Проходит по префиксам длин; смещение i-го документа - offsets[i], конец - offsets[i + 1]."""
+        view, size = self._view, self._size
+        offsets = array("q", [0])
+        pos = 0
+        while pos < size:
+            if pos + 4 > size:
+                raise BsonNotEnoughDataError("Not enough bytes for size")
+            doc_size = STRUCT_INT32.unpack_from(view, pos)[0]
+            if doc_size < 5:
+                raise BsonIncorrectSizeError("Document size too small")
+            if pos + doc_size > size:
+                raise BsonNotEnoughDataError("Not enough data for declared document size")
+            pos += doc_size
+            offsets.append(pos)
+        return offsets
+
+    def _load_index(self) -> memoryview | None:
+        """Отображает sidecar-индекс; устаревший или битый индекс игнорируется."""
+        try:
+            with open(self.index_path, "rb") as f:
+                index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        header = STRUCT_INDEX_HEADER.size
+        if len(index_map) >= header:
+            magic, size, mtime_ns, inode, count = STRUCT_INDEX_HEADER.unpack_from(index_map)
+            # одного размера мало: перезаписанный файл той же длины может иначе делиться на документы
+            same_file = (size, mtime_ns, inode) == (self._size, self._mtime_ns, self._inode)
+            if magic == INDEX_MAGIC and same_file and len(index_map) == header + 8 * (count + 1):
+                self._index_map = index_map
+                return memoryview(index_map)[header:].cast("q")
+        index_map.close()
+        return None
+
+
+# мапперы воркеров marshal_batch/unmarshal_batch: один на конфигурацию, живёт вместе с процессом
+_BATCH_MAPPERS: dict[tuple, Mapper] = {}
+
+
+def _batch_mapper(config: dict[str, Any], classes: tuple[type, ...]) -> Mapper:
+    key = (tuple(sorted(config.items())), classes)
+    mapper = _BATCH_MAPPERS.get(key)
+    if mapper is None:
+        mapper = _BATCH_MAPPERS[key] = Mapper(**config)
+        for cls in classes:
+            mapper.register(cls)
+    return mapper
+
+
+def _marshal_chunk(config: dict[str, Any], classes: tuple[type, ...], docs: list[Any]) -> list[bytes]:
+    mapper = _batch_mapper(config, classes)
+    return [mapper.marshal(doc) for doc in docs]
+
+
+def _unmarshal_chunk(config: dict[str, Any], classes: tuple[type, ...], blobs: list[bytes]) -> list[Any]:
+    mapper = _batch_mapper(config, classes)
+    return [mapper.unmarshal(blob) for blob in blobs]
+
+
+def _unmarshal_one(config: dict[str, Any], classes: tuple[type, ...], data: bytes) -> Any:
+    # свой маппер на вызов: маппер вызывающего в это время может разбирать другие документы в event loop
+    mapper = Mapper(**config)
+    for cls in classes:
+        mapper.register(cls)
+    return mapper.unmarshal(data)
+
+
+# оценка скорости разбора в байтах в секунду для read_document, уточняется по разборам в event loop
+_decode_rate = 4 * 1024 * 1024
+
+
+def _observe_decode_rate(size: int, seconds: float) -> None:
+    global _decode_rate
+    if size >= ASYNC_RATE_MIN_SIZE and seconds > 0:
+        _decode_rate = 0.8 * _decode_rate + 0.2 * (size / seconds)
+
+
 # ====================
 # WRAPPERS
 # ====================
@@ -1037,6 +2649,32 @@ def marshal(data: dict[str, Any]) -> bytes:
     return Mapper().marshal(data)
 
 
-def unmarshal(data: bytes) -> dict[str, Any]:
-    return Mapper().unmarshal(data)
+def unmarshal(data: BytesLike, fields: Iterable[str] | None = None) -> dict[str, Any]:
+    return Mapper().unmarshal(data, fields)
+
+
+def iter_unmarshal(stream: BinaryIO) -> Iterator[dict[str, Any]]:
+    return Mapper().iter_unmarshal(stream)
+
+
+def marshal_many(docs: Iterable[Any], stream: BinaryIO) -> int:
+    return Mapper().marshal_many(docs, stream)
+
+
+def marshal_batch(docs: Iterable[Any], workers: int | None = None, executor: Executor | None = None) -> list[bytes]:
+    return Mapper().marshal_batch(docs, workers, executor)
+
+
+def unmarshal_batch(blobs: Iterable[BytesLike], workers: int | None = None,
+                    executor: Executor | None = None) -> list[dict[str, Any]]:
+    return Mapper().unmarshal_batch(blobs, workers, executor)
+
+
+async def read_document(reader: asyncio.StreamReader, budget: float | None = None,
+                        executor: Executor | None = None) -> dict[str, Any] | None:
+    return await Mapper().read_document(reader, budget, executor)
+
+
+async def write_document(writer: asyncio.StreamWriter, doc: Any) -> int:
+    return await Mapper().write_document(writer, doc)
 # endregion
@@ -1,13 +1,19 @@
 # pyrefly: ignore-errors
 
 import bson
+import copy
+import os
+import pickle
 import pytest
 import random
 import string
-from typing import Any, Dict
+import sys
+import struct
+from typing import Any, Dict, NamedTuple
 from datetime import datetime, timezone
 from collections import namedtuple as nt
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
 
 
 def test_marshal_dict_empty() -> None:
@@ -5930,3 +5936,696 @@ def test_bidi_singleton_nt_with_array_as_root() -> None:
     m = bson.Mapper(keep_types=True)
     v2 = m.unmarshal(m.marshal(v))
     assert v2 == v
+
+
+def test_unmarshal_accepts_buffer_objects() -> None:
+    import mmap
+
+    inp = {"b": b"\x01\x02\x03", "s": "строка", "d": {"x": [1, 2.5, None]}}
+    data = bson.marshal(inp)
+    for buf in (data, bytearray(data), memoryview(data)):
+        assert bson.unmarshal(buf) == inp
+
+    mm = mmap.mmap(-1, len(data))
+    mm.write(data)
+    assert bson.Mapper().unmarshal(mm) == inp
+    mm.close()
+
+
+def test_unmarshal_zero_copy_binary() -> None:
+    inp = {"b": b"payload", "lst": [b"", b"\x00\xff"]}
+    data = bytearray(bson.marshal(inp))
+    result = bson.Mapper(zero_copy=True).unmarshal(data)
+    assert type(result["b"]) is memoryview  # noqa: E721
+    assert result["b"] == b"payload"
+    assert [bytes(v) for v in result["lst"]] == inp["lst"]
+
+    data[data.index(b"payload")] = ord("P")
+    assert result["b"] == b"Payload"
+
+
+def test_unmarshal_zero_copy_keep_types_bytearray() -> None:
+    inp = {"ba": bytearray(b"abc"), "b": b"abc"}
+    m = bson.Mapper(keep_types=True, zero_copy=True)
+    result = m.unmarshal(m.marshal(inp))
+    assert type(result["ba"]) is bytearray  # noqa: E721
+    assert result == inp
+
+
+def test_marshal_subclasses_match_base_types() -> None:
+    from collections import OrderedDict
+    from enum import IntEnum
+
+    class Color(IntEnum):
+        RED = 1
+
+    class Text(str):
+        pass
+
+    inp = OrderedDict(c=Color.RED, t=Text("abc"), l=[Color.RED, Text("d")])
+    assert bson.marshal(inp) == bson.marshal({"c": 1, "t": "abc", "l": [1, "d"]})
+
+
+def test_marshal_deep_nesting_sizes() -> None:
+    inp: Dict[str, Any] = {"leaf": "x" * 1000}
+    for i in range(100):
+        inp = {"k": inp, "a": [i, [i]]}
+    data = bson.marshal(inp)
+    assert int.from_bytes(data[:4], "little") == len(data)
+    round_dict_test(inp)
+
+
+def test_stream_roundtrip_many_documents() -> None:
+    import io
+
+    docs = [{"i": i, "s": "x" * i, "l": [i, str(i)]} for i in range(50)]
+    stream = io.BytesIO()
+    assert bson.marshal_many(docs, stream) == len(docs)
+    assert stream.getvalue() == b"".join(bson.marshal(d) for d in docs)
+
+    stream.seek(0)
+    assert list(bson.iter_unmarshal(stream)) == docs
+    assert list(bson.iter_unmarshal(io.BytesIO())) == []
+
+
+def test_stream_truncated_document() -> None:
+    import io
+
+    data = bson.marshal({"a": 1}) + bson.marshal({"b": "abc"})
+    for cut in (2, 9):
+        docs = bson.iter_unmarshal(io.BytesIO(data[:-cut]))
+        assert next(docs) == {"a": 1}
+        with pytest.raises(bson.BsonNotEnoughDataError):
+            next(docs)
+
+
+def test_unmarshal_lazy_matches_unmarshal() -> None:
+    inp = {
+        "a": 1,
+        "b": {"c": [1, "x", {"d": b"\x00"}], "e": {"f": None}},
+        "g": datetime(2020, 1, 1, tzinfo=timezone.utc),
+        "h": 2.5,
+    }
+    m = bson.Mapper()
+    lazy = m.unmarshal_lazy(m.marshal(inp))
+    assert len(lazy) == 4
+    assert list(lazy.keys()) == list(m.unmarshal(m.marshal(inp)).keys())
+    assert isinstance(lazy["b"], bson.LazyDocument)
+    assert lazy["b"]["c"] == [1, "x", {"d": b"\x00"}]
+    assert lazy.to_dict() == inp
+    assert lazy == inp
+
+
+def test_unmarshal_lazy_defers_value_errors() -> None:
+    data = bytearray(bson.marshal({"bad": "ab", "good": 7}))
+    data[data.index(b"ab")] = 0xFF
+    lazy = bson.Mapper().unmarshal_lazy(data)
+    assert list(lazy) == ["bad", "good"]
+    assert lazy["good"] == 7
+    with pytest.raises(bson.BsonBadStringDataError):
+        lazy["bad"]
+    with pytest.raises(KeyError):
+        lazy["missing"]
+
+
+def test_unmarshal_lazy_keep_types() -> None:
+    P = nt("P", ["x", "y"])
+    inp = {"t": (1, 2), "ba": bytearray(b"q"), "p": P(1, "2")}
+    m = bson.Mapper(keep_types=True)
+    lazy = m.unmarshal_lazy(m.marshal(inp))
+    assert lazy["t"] == (1, 2)
+    assert type(lazy["ba"]) is bytearray  # noqa: E721
+    assert lazy.to_dict() == inp
+
+
+def test_unmarshal_lazy_nested_namedtuples_match_unmarshal() -> None:
+    P = nt("P", ["x", "y"])
+    inp = {"a": {"p": P(1, 2), "q": {"r": P(3, 4)}}, "l": [P(5, 6)]}
+    m = bson.Mapper(keep_types=True)
+    data = m.marshal(inp)
+    lazy = m.unmarshal_lazy(data)
+    assert isinstance(lazy["a"], bson.LazyDocument)
+    assert lazy.to_dict() == m.unmarshal(data)
+    assert list(lazy["a"].to_dict()) == ["p", "q"]
+
+
+def test_unmarshal_fields_projection() -> None:
+    inp = {
+        "a": {"b": 1, "c": "skip", "d": {"e": [1, 2]}},
+        "c": b"\x01",
+        "x": "not requested",
+        "arr": [{"b": 1, "z": 2}, 5, {"z": 3}],
+    }
+    data = bson.marshal(inp)
+    assert bson.unmarshal(data, fields=["a.b", "c"]) == {"a": {"b": 1}, "c": b"\x01"}
+    assert bson.unmarshal(data, fields=["a", "a.b"]) == {"a": inp["a"]}
+    assert bson.unmarshal(data, fields=["a.d.e", "missing", "x.y"]) == {"a": {"d": {"e": [1, 2]}}}
+    assert bson.unmarshal(data, fields=["arr.b"]) == {"arr": [{"b": 1}, {}]}
+    assert bson.unmarshal(data, fields=[]) == {}
+
+
+def test_unmarshal_fields_skips_unrequested_values() -> None:
+    data = bytearray(bson.marshal({"bad": "ab", "good": 7}))
+    data[data.index(b"ab")] = 0xFF
+    assert bson.unmarshal(data, fields=["good"]) == {"good": 7}
+    with pytest.raises(bson.BsonBadStringDataError):
+        bson.unmarshal(data, fields=["bad"])
+
+
+def test_unmarshal_fields_keep_types() -> None:
+    P = nt("P", ["x", "y"])
+    inp = {"p": P(1, "2"), "t": (1, 2), "s": "skip"}
+    m = bson.Mapper(keep_types=True)
+    assert m.unmarshal(m.marshal(inp), fields=["t", "p"]) == {"t": (1, 2), "p": P(1, "2")}
+
+
+def test_unmarshal_columns() -> None:
+    import io
+
+    np = pytest.importorskip("numpy")
+    docs = [
+        {"id": i, "big": 2**40 + i, "score": i / 2, "ok": i % 2 == 0, "name": f"n{i}",
+         "ts": datetime(2020, 1, 1, tzinfo=timezone.utc), "extra": [i]}
+        for i in range(5)
+    ]
+    docs[3]["big"] = 3
+    del docs[4]["score"]
+    schema = {
+        "id": bson.TYPE_INT32, "big": bson.TYPE_INT64, "score": bson.TYPE_DOUBLE,
+        "ok": bson.TYPE_BOOLEAN, "name": bson.TYPE_STRING, "ts": bson.TYPE_DATETIME,
+    }
+    stream = io.BytesIO()
+    bson.marshal_many(docs, stream)
+    stream.seek(0)
+    for source in ([bson.marshal(d) for d in docs], stream):
+        cols = bson.Mapper().unmarshal_columns(source, schema)
+        assert list(cols) == list(schema)
+        assert cols["id"].dtype == np.int32 and cols["id"].tolist() == [0, 1, 2, 3, 4]
+        assert cols["big"].tolist() == [2**40, 2**40 + 1, 2**40 + 2, 3, 2**40 + 4]
+        assert cols["score"][:4].tolist() == [0.0, 0.5, 1.0, 1.5] and np.isnan(cols["score"][4])
+        assert cols["ok"].dtype == np.bool_ and cols["ok"].tolist() == [True, False, True, False, True]
+        assert cols["name"].dtype == object and cols["name"].tolist() == ["n0", "n1", "n2", "n3", "n4"]
+        assert cols["ts"][0] == np.datetime64("2020-01-01T00:00:00.000")
+
+
+def test_unmarshal_columns_type_mismatch() -> None:
+    pytest.importorskip("numpy")
+    m = bson.Mapper()
+    with pytest.raises(bson.BsonInvalidElementTypeError):
+        m.unmarshal_columns([bson.marshal({"a": "x"})], {"a": bson.TYPE_INT32})
+    with pytest.raises(bson.BsonUnmarshalError):
+        m.unmarshal_columns([bson.marshal({})], {"a": bson.TYPE_INT32})
+    with pytest.raises(bson.MapperConfigError):
+        m.unmarshal_columns([], {"a": bson.TYPE_ARRAY})
+
+
+def test_unmarshal_nt_class_cache() -> None:
+    P = nt("P", ["x", "y"])
+    inp = {"a": P(1, 2), "b": P(3, 4), "c": P(5, 6)}
+    m = bson.Mapper(keep_types=True)
+    data = m.marshal(inp)
+    result = m.unmarshal(data)
+    assert result == inp
+    assert type(result["a"]) is type(result["b"]) is type(result["c"])  # noqa: E721
+    assert m.nt_cache_misses == 1
+    assert m.nt_cache_hits == 2
+
+    m.unmarshal(data)
+    assert (m.nt_cache_misses, m.nt_cache_hits) == (1, 5)
+
+
+def test_unmarshal_nt_class_cache_bounded_and_shared() -> None:
+    cache = bson.NamedTupleCache(2)
+    a = cache.get("A", ["x"], {})
+    cache.get("B", ["x"], {})
+    assert cache.get("A", ["x"], {}) is a
+    cache.get("C", ["x"], {})
+    assert len(cache) == 2
+    assert cache.get("B", ["x"], {}) is not None and cache.misses == 4
+
+    m1 = bson.Mapper(keep_types=True, shared_nt_cache=True)
+    m2 = bson.Mapper(keep_types=True, shared_nt_cache=True)
+    assert m1._nt_classes is m2._nt_classes is bson.SHARED_NT_CACHE
+
+
+def test_marshal_class_schema_cache() -> None:
+    import gc
+
+    @dataclass
+    class Rec:
+        b: int
+        a: str
+
+    class Props:
+        @property
+        def y(self) -> int:
+            return 2
+
+        @property
+        def x(self) -> int:
+            return 1
+
+    data = bson.marshal({"r": [Rec(1, "q"), Rec(2, "w")]})
+    assert bson.unmarshal(data) == {"r": [{"b": 1, "a": "q"}, {"b": 2, "a": "w"}]}
+    assert bson.marshal({"p": Props()}) == bson.marshal({"p": {"x": 1, "y": 2}})
+    assert bson._class_schema(Rec).fields == ["b", "a"]
+    assert bson._class_schema(Props).properties == ["x", "y"]
+
+    count = len(bson._CLASS_SCHEMAS)
+    del Rec, Props
+    gc.collect()
+    assert len(bson._CLASS_SCHEMAS) == count - 2
+
+
+def test_register_compiled_plans() -> None:
+    @dataclass
+    class Rec:
+        id: int
+        name: str
+        score: float
+        ok: bool
+        tags: list
+
+    class Point(NamedTuple):
+        x: float
+        y: float
+
+    m = bson.Mapper()
+    assert m.register(Rec) is Rec
+    m.register(Point)
+    generic = bson.Mapper()
+    for rec in (Rec(1, "a", 0.5, True, ["x"]), Rec(2**40, "б", 1, False, []), Rec(-1, 5, float("inf"), 1, [1])):
+        assert m.marshal(rec) == generic.marshal(rec)
+        assert m.marshal({"r": [rec]}) == generic.marshal({"r": [rec]})
+    for p in (Point(1.5, -2.0), Point(1, 2)):
+        assert m.marshal(p) == generic.marshal(p)
+
+    rec = Rec(7, "name", 2.5, True, [1, "2"])
+    assert m.unmarshal_as(m.marshal(rec), Rec) == rec
+    assert m.unmarshal_as(m.marshal(Point(1.5, 2.5)), Point) == Point(1.5, 2.5)
+    assert m.unmarshal_as(bson.marshal({"y": 2.0, "x": 1.0}), Point) == Point(1.0, 2.0)
+
+
+def test_register_errors() -> None:
+    m = bson.Mapper()
+    with pytest.raises(bson.MapperConfigError):
+        m.register(dict)
+    with pytest.raises(bson.MapperConfigError):
+        m.unmarshal_as(bson.marshal({}), nt("Q", []))
+
+    @dataclass
+    class Derived:
+        a: int
+        b: int = field(init=False)
+
+        def __post_init__(self) -> None:
+            self.b = 2 * self.a
+
+    with pytest.raises(bson.MapperConfigError):
+        m.register(Derived)
+
+
+def test_register_kw_only_dataclass() -> None:
+    @dataclass(kw_only=True)
+    class Rec:
+        id: int
+        name: str
+        score: float = 0.0
+
+    m = bson.Mapper()
+    m.register(Rec)
+    rec = Rec(id=3, name="x", score=1.5)
+    assert m.unmarshal_as(m.marshal(rec), Rec) == rec
+    assert m.unmarshal_as(bson.marshal({"name": "y", "id": 4}), Rec) == Rec(id=4, name="y")
+
+
+def test_batch_roundtrip_keeps_order(monkeypatch: pytest.MonkeyPatch) -> None:
+    docs = [{"i": i, "s": "x" * (i % 7), "t": (i, float(i)), "b": bytes([i % 256])} for i in range(50)]
+    m = bson.Mapper(keep_types=True)
+    expected = [m.marshal(doc) for doc in docs]
+
+    # ниже порога всё считается в текущем процессе
+    assert m.marshal_batch(docs, workers=2) == expected
+    monkeypatch.setattr(bson, "BATCH_MIN_DOCS", 10)
+    assert m.marshal_batch(docs, workers=2) == expected
+    assert m.unmarshal_batch(expected, workers=2) == docs
+    assert bson.unmarshal_batch([memoryview(bson.marshal(doc)) for doc in docs], workers=2) == \
+        [bson.unmarshal(bson.marshal(doc)) for doc in docs]
+
+
+def test_batch_namedtuples_and_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(bson, "BATCH_MIN_DOCS", 2)
+    m = bson.Mapper(keep_types=True)
+    blobs = [m.marshal({"p": nt("P", ["x", "y"])(i, -i)}) for i in range(4)]
+    result = m.unmarshal_batch(blobs, workers=2)
+    assert [(doc["p"].x, doc["p"].y) for doc in result] == [(i, -i) for i in range(4)]
+    assert type(result[0]["p"]).__name__ == "P"
+
+    with pytest.raises(bson.BsonBrokenDataError):
+        m.unmarshal_batch(blobs + [b"\x05\x00\x00\x00"], workers=2)
+
+
+def test_batch_reuses_executor(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(bson, "BATCH_MIN_DOCS", 2)
+    m = bson.Mapper(keep_types=True)
+    docs = [{"i": i, "t": (i, str(i))} for i in range(20)]
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        for _ in range(2):
+            blobs = m.marshal_batch(docs, executor=pool)
+            assert blobs == [m.marshal(doc) for doc in docs]
+            assert m.unmarshal_batch(blobs, executor=pool) == docs
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert bson.unmarshal_batch(blobs, executor=pool) == [bson.unmarshal(blob) for blob in blobs]
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_decoded_namedtuple_copies_keep_class(shared: bool) -> None:
+    P = nt("P", "x y", defaults=(5,))
+    m = bson.Mapper(keep_types=True, shared_nt_cache=shared)
+    decoded = m.unmarshal(m.marshal({"a": P(1)}))["a"]
+    for clone in (copy.copy(decoded), copy.deepcopy(decoded), pickle.loads(pickle.dumps(decoded))):
+        assert type(clone) is type(decoded)
+        assert clone == decoded
+
+
+def _nested_document(depth: int) -> bytes:
+    # собираем вручную: marshal сам по себе рекурсивен
+    body = b""
+    for i in range(depth):
+        body = b"\x03a\x00" + (len(body) + 5).to_bytes(4, "little") + body + b"\x00" + \
+            b"\x10v\x00" + i.to_bytes(4, "little")
+    return (len(body) + 5).to_bytes(4, "little") + body + b"\x00"
+
+
+def test_unmarshal_deep_nesting_without_recursion() -> None:
+    depth = 10_000
+    doc = bson.unmarshal(_nested_document(depth))
+    level = 0
+    while doc["a"]:
+        assert doc["v"] == depth - 1 - level
+        doc = doc["a"]
+        level += 1
+    assert level == depth - 1
+
+    # тип вложенного элемента на глубине 5000: каждый уровень начинается с b"\x03a\x00" + размер
+    broken = bytearray(_nested_document(depth))
+    broken[4 + 7 * 5000] = 0x11
+    with pytest.raises(bson.BsonInvalidElementTypeError):
+        bson.Mapper(python_only=True).unmarshal(bytes(broken))
+    with pytest.raises(bson.BsonBrokenDataError):
+        bson.unmarshal(_nested_document(depth)[:-3] + b"\x00\x00")
+
+
+def test_key_caches_share_strings_and_stay_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    blob = bson.marshal({"".join(["shared", "_key"]): 1})
+    first, second = bson.unmarshal(blob), bson.unmarshal(bytearray(blob))
+    assert next(iter(first)) is next(iter(second))
+
+    long_key = "к" * 300
+    assert bson.unmarshal(bson.marshal({long_key: None, "x": 1})) == {long_key: None, "x": 1}
+    with pytest.raises(bson.BsonBadKeyDataError):
+        bson.unmarshal(b"\x0c\x00\x00\x00\x10" + b"k" * 7)
+
+    monkeypatch.setattr(bson, "KEY_CACHE_SIZE", 8)
+    doc = {f"key{i}": i for i in range(50)}
+    assert bson.unmarshal(bson.marshal(doc)) == doc
+    assert len(bson._KEY_BYTES) <= 8
+    assert len(bson._KEY_STRS) <= 8
+
+
+def test_cycle_check_depth() -> None:
+    shared = {"x": 1}
+    deep: Dict[str, Any] = {"a": shared, "b": [shared, shared]}
+    for _ in range(50):
+        deep = {"n": deep}
+    for depth in (0, 1, 32, 100):
+        m = bson.Mapper(cycle_check_depth=depth)
+        assert m.unmarshal(m.marshal(deep)) == deep
+
+        # цикл, который начинается глубже порога
+        looped: Dict[str, Any] = {"lst": []}
+        looped["lst"].append({"back": looped})
+        data: Dict[str, Any] = {"k": looped}
+        for _ in range(40):
+            data = {"k": [data]}
+        with pytest.raises(bson.BsonCycleDetectedError):
+            m.marshal(data)
+        assert not m._path
+
+
+def test_cycle_check_shared_mapper_across_threads() -> None:
+    # у каждого потока свой путь обхода: один и тот же объект в соседнем потоке - не цикл
+    shared = {"v": [{"x": i, "s": "y" * 20} for i in range(200)]}
+    data = {"a": [shared] * 20, "b": shared}
+    m = bson.Mapper(cycle_check_depth=0)
+    expected = m.marshal(data)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(lambda _: m.marshal(data), range(40)))
+    finally:
+        sys.setswitchinterval(interval)
+    assert results == [expected] * 40
+    assert not m._path
+
+
+def test_bson_file_random_access(tmp_path: Any) -> None:
+    docs = [{"i": i, "payload": b"x" * (i % 5), "name": str(i) * (i % 3)} for i in range(100)]
+    path = tmp_path / "dump.bson"
+    with open(path, "wb") as f:
+        bson.marshal_many(docs, f)
+
+    with bson.BsonFile(path, save_index=True) as bf:
+        assert len(bf) == 100
+        assert bf[0] == docs[0] and bf[57] == docs[57] and bf[-1] == docs[-1]
+        assert bf[10:20:3] == docs[10:20:3]
+        assert list(bf) == docs
+        with pytest.raises(IndexError):
+            bf[100]
+    assert (tmp_path / "dump.bson.idx").exists()
+
+    # повторное открытие читает sidecar-индекс
+    with bson.BsonFile(path) as bf:
+        assert isinstance(bf._offsets, memoryview)
+        assert bf[99] == docs[99] and len(bf) == 100
+
+    # файл данных изменился: устаревший индекс игнорируется
+    with open(path, "ab") as f:
+        f.write(bson.marshal({"i": 100}))
+    with bson.BsonFile(path) as bf:
+        assert len(bf) == 101 and bf[100] == {"i": 100}
+
+
+def test_bson_file_index_of_rewritten_file(tmp_path: Any) -> None:
+    path = tmp_path / "dump.bson"
+    path.write_bytes(bson.marshal({"a": "x" * 10}) + bson.marshal({"b": 1}))
+    with bson.BsonFile(path, save_index=True) as bf:
+        assert len(bf) == 2
+
+    # тот же размер, другие границы документов
+    path.write_bytes(bson.marshal({"a": "x" * 3}) + bson.marshal({"b": 1, "c": 2}))
+    assert path.stat().st_size == sum(len(bson.marshal(doc)) for doc in ({"a": "x" * 10}, {"b": 1}))
+    # на файловых системах с грубыми отметками времени перезапись может не сдвинуть mtime
+    mtime = path.stat().st_mtime_ns + 10 ** 9
+    os.utime(path, ns=(mtime, mtime))
+    with bson.BsonFile(path) as bf:
+        assert not isinstance(bf._offsets, memoryview)
+        assert list(bf) == [{"a": "x" * 3}, {"b": 1, "c": 2}]
+
+
+def test_bson_file_broken_and_empty(tmp_path: Any) -> None:
+    path = tmp_path / "empty.bson"
+    path.write_bytes(b"")
+    with bson.BsonFile(path) as bf:
+        assert len(bf) == 0 and list(bf) == []
+
+    path.write_bytes(bson.marshal({"a": 1}) + b"\x10\x00\x00\x00\x00")
+    with pytest.raises(bson.BsonNotEnoughDataError):
+        bson.BsonFile(path)
+
+
+def test_compact_metadata_runs() -> None:
+    data = {
+        "tuples": [(i, i) for i in range(1000)],
+        "mixed": [(1,), [2], (3,), bytearray(b"a"), bytearray(b"c"), b"b"],
+        "few": (1, 2),
+    }
+    plain = bson.Mapper(keep_types=True)
+    compact = bson.Mapper(keep_types=True, compact_metadata=True)
+    small, big = compact.marshal(data), plain.marshal(data)
+    assert len(big) - len(small) > 5000
+    assert compact.unmarshal(small) == plain.unmarshal(big) == data
+    assert plain.unmarshal(small) == data
+    assert compact.unmarshal_lazy(small).to_dict() == data
+
+    # на коротком документе серии не выигрывают, и остаётся текстовый формат
+    assert compact.marshal({"t": (1,)}) == plain.marshal({"t": (1,)})
+
+
+@pytest.mark.parametrize("count", [50_000_000, 0xFFFFFFFF])
+def test_compact_metadata_huge_run_count(count: int) -> None:
+    payload = b"\x01" + struct.pack("<I", count) + b"tuple\x00"
+    body = b"\x05__metadata__\x00" + struct.pack("<i", len(payload)) + bytes([bson.SUBTYPE_USER_METADATA]) + payload
+    data = struct.pack("<i", 4 + len(body) + 1) + body + b"\x00"
+    mapper = bson.Mapper(keep_types=True, compact_metadata=True)
+    with pytest.raises(bson.BsonBrokenDataError):
+        mapper.unmarshal(data)
+    with pytest.raises(bson.BsonBrokenDataError):
+        mapper.unmarshal_lazy(data).to_dict()
+
+
+def test_compact_metadata_nested_runs_stay_compact() -> None:
+    import tracemalloc
+
+    def element(key: bytes, value: bytes) -> bytes:
+        return key + b"\x00" + value
+
+    def document(*elements: bytes) -> bytes:
+        body = b"".join(elements)
+        return struct.pack("<i", 4 + len(body) + 1) + body + b"\x00"
+
+    def metadata(count: int) -> bytes:
+        payload = b"\x01" + struct.pack("<I", count) + b"tuple\x00"
+        return struct.pack("<i", len(payload)) + bytes([bson.SUBTYPE_USER_METADATA]) + payload
+
+    # каждый из 40 вложенных документов длиннее мегабайта и честно может заявить 400k подсказок
+    pad = b"\x05pad\x00" + struct.pack("<i", 1 << 20) + b"\x00" + b"x" * (1 << 20)
+    data = document(pad)
+    for _ in range(40):
+        data = document(element(b"\x05__metadata__", metadata(400_000)), element(b"\x03d", data))
+    assert len(data) < (1 << 20) + 2000
+
+    mapper = bson.Mapper(keep_types=True, compact_metadata=True)
+    tracemalloc.start()
+    try:
+        result = mapper.unmarshal(data)
+        lazy = mapper.unmarshal_lazy(data).to_dict()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 16 * (1 << 20)
+    assert lazy == result
+    for _ in range(40):
+        assert list(result) == ["d"]
+        result = result["d"]
+    assert len(result["pad"]) == 1 << 20
+
+
+def test_homogeneous_arrays_bulk_paths() -> None:
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    arrays = [
+        list(range(-500, 1500)),
+        [2 ** 40 + i for i in range(120)],
+        [1, 2 ** 40] * 20,
+        [i / 3 for i in range(1001)],
+        [i % 3 == 0 for i in range(64)],
+        [base.replace(second=i % 60, microsecond=i * 1000 % 1000000) for i in range(200)],
+    ]
+    for arr in arrays:
+        data = {"a": arr, "b": {"c": arr[:17]}}
+        # поэлементная сериализация тех же значений даёт те же байты
+        body = b"".join(bson.marshal({"x": value})[4:-1].replace(b"x\x00", str(i).encode() + b"\x00", 1)
+                        for i, value in enumerate(arr))
+        assert bson.marshal({"a": arr})[4:] == b"\x04a\x00" + (len(body) + 5).to_bytes(4, "little") + body + b"\x00\x00"
+        assert bson.unmarshal(bson.marshal(data)) == data
+        assert bson.Mapper(python_only=True).unmarshal(bson.marshal(data)) == data
+
+    with pytest.raises(bson.BsonMarshalError):
+        bson.marshal({"a": [2 ** 63] * 20})
+    blob = bytearray(bson.marshal({"a": list(range(20))}))
+    blob[blob.index(b"15\x00")] = ord("x")
+    with pytest.raises(bson.BsonBadArrayIndexError):
+        bson.unmarshal(bytes(blob))
+
+
+def test_async_read_write_document(monkeypatch: pytest.MonkeyPatch) -> None:
+    import asyncio
+
+    class Writer:
+        def __init__(self) -> None:
+            self.data = bytearray()
+
+        def write(self, data: bytes) -> None:
+            self.data += data
+
+        async def drain(self) -> None:
+            pass
+
+    docs = [{"i": i, "s": "x" * (i * 1000)} for i in range(20)]
+
+    async def roundtrip() -> list[Any]:
+        writer = Writer()
+        for doc in docs:
+            await bson.write_document(writer, doc)
+        reader = asyncio.StreamReader()
+        reader.feed_data(bytes(writer.data))
+        reader.feed_eof()
+        result = []
+        while (doc := await bson.read_document(reader, budget=0.0001)) is not None:
+            result.append(doc)
+        return result
+
+    assert asyncio.run(roundtrip()) == docs
+
+    # каждый документ больше бюджета уходит в executor
+    calls = []
+    monkeypatch.setattr(bson, "_unmarshal_one", lambda *args: calls.append(args) or bson.Mapper().unmarshal(args[2]))
+    assert asyncio.run(roundtrip()) == docs
+    assert calls
+
+    async def read(data: bytes) -> Any:
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await bson.read_document(reader)
+
+    with pytest.raises(bson.BsonNotEnoughDataError):
+        asyncio.run(read(bson.marshal({"a": 1})[:-2]))
+    with pytest.raises(bson.BsonNotEnoughDataError):
+        asyncio.run(read(b"\x05\x00"))
+    with pytest.raises(bson.BsonIncorrectSizeError):
+        asyncio.run(read(b"\x04\x00\x00\x00"))
+
+
+def test_encoded_size_matches_marshal() -> None:
+    @dataclass
+    class Rec:
+        id: int
+        name: str
+
+    P = nt("P", ["x", "y"])
+    docs = [
+        {},
+        {"a": None, "b": True, "c": 2 ** 40, "d": -1, "e": 1.5, "f": "строка", "g": b"\x00", "h": bytearray(b"12")},
+        {"dt": datetime(2020, 1, 1, tzinfo=timezone.utc), "nested": {"l": [1, (2, 3), [4.0] * 30]}},
+        {"p": P(1, [P(2, 3)]), "r": Rec(1, "x"), "t": tuple(range(20))},
+        P(1, 2),
+    ]
+    registered = bson.Mapper()
+    registered.register(Rec)
+    for m in (bson.Mapper(), bson.Mapper(keep_types=True), bson.Mapper(keep_types=True, compact_metadata=True),
+              registered):
+        for doc in docs:
+            assert m.encoded_size(doc) == len(m.marshal(doc))
+
+    with pytest.raises(bson.BsonIntegerTooBigError):
+        bson.Mapper().encoded_size({"a": [2 ** 64]})
+    with pytest.raises(bson.BsonKeyWithZeroByteError):
+        bson.Mapper().encoded_size({"a\x00": 1})
+    with pytest.raises(bson.BsonUnsupportedObjectError):
+        bson.Mapper().encoded_size({"a": object()})
+    looped: Dict[str, Any] = {}
+    looped["a"] = [looped]
+    with pytest.raises(bson.BsonCycleDetectedError):
+        bson.Mapper().encoded_size(looped)
+
+
+def test_oversized_document_fails_early() -> None:
+    chunk = "x" * (1 << 20)
+    big = {f"k{i:03d}": chunk for i in range(64)}
+    assert bson.Mapper().encoded_size(big) > bson.MAX_DOCUMENT_SIZE
+    with pytest.raises(bson.BsonMarshalError):
+        bson.marshal(big)
+    with pytest.raises(bson.BsonMarshalError):
+        bson.marshal({"l": [chunk] * 64})
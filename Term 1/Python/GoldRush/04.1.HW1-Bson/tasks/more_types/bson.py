@@ -1,6 +1,6 @@
 import struct
 import datetime
-from typing import Any
+from typing import Any, BinaryIO, Iterable, Iterator
 from dataclasses import fields as dataclass_fields
 from collections import namedtuple  # <-- добавлено для восстановления namedtuple при unmarshal
 
@@ -576,6 +576,50 @@ class Mapper:
         _, result, _ = self._parse_document(data, 0, size)
         return result
 
+    def iter_unmarshal(self, stream: BinaryIO) -> Iterator[dict[str, Any]]:
+        """Читает из бинарного потока подряд записанные BSON-документы, держа в памяти только один."""
+        header = bytearray(4)
+        while True:
+            got = self._read_exact(stream, header)
+            if got == 0:
+                return
+            if got < 4:
+                raise BsonNotEnoughDataError("Not enough bytes for size")
+
+            size = struct.unpack_from("<i", header)[0]
+            if size < 5:
+                raise BsonIncorrectSizeError("Document size too small")
+            if size > MAX_DOCUMENT_SIZE:
+                raise BsonIncorrectSizeError("Document size exceeds MAX_DOCUMENT_SIZE")
+
+            # длина известна из префикса, поэтому читаем ровно один документ
+            doc = bytearray(size)
+            doc[:4] = header
+            with memoryview(doc) as view:
+                if self._read_exact(stream, view[4:]) < size - 4:
+                    raise BsonNotEnoughDataError("Not enough data for declared document size")
+            yield self.unmarshal(doc)
+
+    def marshal_many(self, docs: Iterable[Any], stream: BinaryIO) -> int:
+        """Пишет документы в поток один за другим; возвращает число записанных документов."""
+        count = 0
+        for doc in docs:
+            stream.write(self.marshal(doc))
+            count += 1
+        return count
+
+    @staticmethod
+    def _read_exact(stream: BinaryIO, buf: bytearray | memoryview) -> int:
+        """Заполняет buf из потока; меньше len(buf) байт возвращается только в конце потока."""
+        got = 0
+        with memoryview(buf) as view:
+            while got < len(view):
+                n = stream.readinto(view[got:])
+                if not n:
+                    break
+                got += n
+        return got
+
     def _parse_document(self, buf: bytes, pos: int, limit: int) -> tuple[int, dict[str, Any], int]:
         if pos + 4 > limit:
             raise BsonBrokenDataError("Not enough bytes for document size")
@@ -961,4 +1005,12 @@ def marshal(data: dict[str, Any]) -> bytes:
 
 def unmarshal(data: bytes) -> dict[str, Any]:
     return Mapper().unmarshal(data)
+
+
+def iter_unmarshal(stream: BinaryIO) -> Iterator[dict[str, Any]]:
+    return Mapper().iter_unmarshal(stream)
+
+
+def marshal_many(docs: Iterable[Any], stream: BinaryIO) -> int:
+    return Mapper().marshal_many(docs, stream)
 # endregion
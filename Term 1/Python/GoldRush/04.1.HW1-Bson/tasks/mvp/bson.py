@@ -1,6 +1,6 @@
 import struct
 import math
-from typing import Any
+from typing import Any, BinaryIO, Iterable, Iterator
 import datetime
 
 PROMPT = '>>> '
@@ -17,6 +17,8 @@ TYPE_NULL = 10
 TYPE_INT32 = 16
 TYPE_INT64 = 18
 
+MAX_DOCUMENT_SIZE = 16 * 1024 * 1024
+
 
 def run_calc(context: dict[str, Any] | None = None) -> None:
     """Run interactive calculator session in specified namespace"""
@@ -186,3 +188,50 @@ def _read_cstring(buf: bytes, pos: int):
     while buf[pos] != 0:
         pos += 1
     return buf[start:pos].decode("utf-8"), pos + 1
+
+
+def iter_unmarshal(stream: BinaryIO) -> Iterator[dict[str, Any]]:
+    """Читает из бинарного потока подряд записанные BSON-документы, держа в памяти только один."""
+    header = bytearray(4)
+    while True:
+        got = _read_exact(stream, header)
+        if got == 0:
+            return
+        if got < 4:
+            raise ValueError("Not enough bytes for size")
+
+        size = struct.unpack_from("<i", header)[0]
+        if size < 5:
+            raise ValueError("Invalid document size")
+        # буфер выделяется по префиксу до чтения данных, поэтому битая длина не должна его раздувать
+        if size > MAX_DOCUMENT_SIZE:
+            raise ValueError("Document size exceeds MAX_DOCUMENT_SIZE")
+
+        # длина известна из префикса, поэтому читаем ровно один документ
+        doc = bytearray(size)
+        doc[:4] = header
+        with memoryview(doc) as view:
+            if _read_exact(stream, view[4:]) < size - 4:
+                raise ValueError("Not enough data for declared document size")
+        yield unmarshal(doc)
+
+
+def marshal_many(docs: Iterable[dict[str, Any]], stream: BinaryIO) -> int:
+    """Пишет документы в поток один за другим; возвращает число записанных документов."""
+    count = 0
+    for doc in docs:
+        stream.write(marshal(doc))
+        count += 1
+    return count
+
+
+def _read_exact(stream: BinaryIO, buf: bytearray | memoryview) -> int:
+    """Заполняет buf из потока; меньше len(buf) байт возвращается только в конце потока."""
+    got = 0
+    with memoryview(buf) as view:
+        while got < len(view):
+            n = stream.readinto(view[got:])
+            if not n:
+                break
+            got += n
+    return got
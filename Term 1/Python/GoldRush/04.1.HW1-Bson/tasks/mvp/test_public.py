@@ -1114,3 +1114,31 @@ def mappers_differ_by_keep_types_dict_test(mapper1: Any, mapper2: Any, inputs: A
         assert data1[-1] == data2[-1]
         assert data1[1:-1] == data2[1 : len(data1) - 1]
         assert added == data2[len(data1) - 1 : -1]
+
+
+def test_stream_roundtrip_many_documents() -> None:
+    import io
+
+    docs = [{"i": i, "s": "x" * i, "l": [i, str(i)]} for i in range(50)]
+    stream = io.BytesIO()
+    assert bson.marshal_many(docs, stream) == len(docs)
+    assert stream.getvalue() == b"".join(bson.marshal(d) for d in docs)
+
+    stream.seek(0)
+    assert list(bson.iter_unmarshal(stream)) == docs
+    assert list(bson.iter_unmarshal(io.BytesIO())) == []
+
+
+def test_stream_rejects_oversized_prefix() -> None:
+    import io
+    import pytest
+    import tracemalloc
+
+    stream = io.BytesIO(b"\xff\xff\xff\x7f" + b"\x00" * 16)
+    tracemalloc.start()
+    try:
+        with pytest.raises(ValueError):
+            next(bson.iter_unmarshal(stream))
+        assert tracemalloc.get_traced_memory()[1] < 1024 * 1024
+    finally:
+        tracemalloc.stop()
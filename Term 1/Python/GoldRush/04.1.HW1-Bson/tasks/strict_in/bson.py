@@ -1,5 +1,5 @@
 import struct
-from typing import Any
+from typing import Any, BinaryIO, Iterable, Iterator
 import datetime
 
 PROMPT = '>>> '
@@ -456,4 +456,48 @@ def _skip_known_type(typ: int, buf: bytes, pos: int, limit: int) -> int:
         return pos + doc_size
 
     raise BsonInvalidElementTypeError(f"Unsupported BSON type {typ}")
+
+
+def iter_unmarshal(stream: BinaryIO) -> Iterator[dict[str, Any]]:
+    """Читает из бинарного потока подряд записанные BSON-документы, держа в памяти только один."""
+    header = bytearray(4)
+    while True:
+        got = _read_exact(stream, header)
+        if got == 0:
+            return
+        if got < 4:
+            raise BsonNotEnoughDataError("Not enough bytes for size")
+
+        size = struct.unpack_from("<i", header)[0]
+        if size < 5 or size > MAX_DOCUMENT_SIZE:
+            raise BsonIncorrectSizeError("Invalid document size")
+
+        # длина известна из префикса, поэтому читаем ровно один документ
+        doc = bytearray(size)
+        doc[:4] = header
+        with memoryview(doc) as view:
+            if _read_exact(stream, view[4:]) < size - 4:
+                raise BsonNotEnoughDataError("Not enough data for declared document size")
+        yield unmarshal(doc)
+
+
+def marshal_many(docs: Iterable[dict[str, Any]], stream: BinaryIO) -> int:
+    """Пишет документы в поток один за другим; возвращает число записанных документов."""
+    count = 0
+    for doc in docs:
+        stream.write(marshal(doc))
+        count += 1
+    return count
+
+
+def _read_exact(stream: BinaryIO, buf: bytearray | memoryview) -> int:
+    """Заполняет buf из потока; меньше len(buf) байт возвращается только в конце потока."""
+    got = 0
+    with memoryview(buf) as view:
+        while got < len(view):
+            n = stream.readinto(view[got:])
+            if not n:
+                break
+            got += n
+    return got
 #endregion
@@ -1718,3 +1718,27 @@ def test_array_indices_zero_one_zero() -> None:
     data = [29, 0, 0, 0, 4, 0, 22, 0, 0, 0, 10, 48, 0, 16, 49, 0, 32, 0, 0, 0, 16, 48, 0, 32, 0, 0, 0, 0, 0]
     with pytest.raises(bson.BsonRepeatedKeyDataError):
         bson.unmarshal(bytes(data))
+
+
+def test_stream_roundtrip_many_documents() -> None:
+    import io
+
+    docs = [{"i": i, "s": "x" * i, "l": [i, str(i)]} for i in range(50)]
+    stream = io.BytesIO()
+    assert bson.marshal_many(docs, stream) == len(docs)
+    assert stream.getvalue() == b"".join(bson.marshal(d) for d in docs)
+
+    stream.seek(0)
+    assert list(bson.iter_unmarshal(stream)) == docs
+    assert list(bson.iter_unmarshal(io.BytesIO())) == []
+
+
+def test_stream_truncated_document() -> None:
+    import io
+
+    data = bson.marshal({"a": 1}) + bson.marshal({"b": "abc"})
+    for cut in (2, 9):
+        docs = bson.iter_unmarshal(io.BytesIO(data[:-cut]))
+        assert next(docs) == {"a": 1}
+        with pytest.raises(bson.BsonNotEnoughDataError):
+            next(docs)
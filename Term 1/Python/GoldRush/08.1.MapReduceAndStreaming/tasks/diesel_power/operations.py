@@ -1,10 +1,16 @@
 import heapq
+import operator
+import os
+import pickle
 import re
 import string
+import tempfile
 import typing as tp
+import zlib
 from abc import ABC, abstractmethod
-from collections import defaultdict
-from itertools import groupby
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import chain, groupby, islice
 
 TRow = dict[str, tp.Any]
 TRowsIterable = tp.Iterable[TRow]
@@ -50,11 +56,77 @@ class Mapper(ABC):
         pass
 
 
+_worker_mapper: Mapper | None = None
+
+
+def _init_map_worker(mapper: Mapper) -> None:
+    global _worker_mapper
+    _worker_mapper = mapper
+
+
+def _map_chunk(rows: list[TRow]) -> list[TRow]:
+    assert _worker_mapper is not None
+    return [result for row in rows for result in _worker_mapper(row)]
+
+
 class Map(Operation):
-    def __init__(self, mapper: Mapper) -> None:
+    """
+    Apply mapper to every row.
+    With workers > 1 rows are sent to a process pool in chunks of chunk_size, at most
+    2 * workers chunks at a time, so memory does not grow with the table.
+    Results are yielded as soon as their chunk is done (with ordered=True, once all earlier chunks are done too).
+    """
+    def __init__(self, mapper: Mapper, workers: int = 1, chunk_size: int = 1024, ordered: bool = True) -> None:
+        """
+        :param mapper: mapper to apply, must be picklable unless worker processes are forked
+        :param workers: number of worker processes, 1 maps in the current process
+        :param chunk_size: rows sent to a worker at once
+        :param ordered: keep order of input rows
+        """
+        if workers < 1 or chunk_size < 1:
+            raise ValueError('workers and chunk_size must be positive')
         self._mapper = mapper
+        self._workers = workers
+        self._chunk_size = chunk_size
+        self._ordered = ordered
+
+    def _parallel(self, rows: TRowsIterable) -> TRowsGenerator:
+        iterator = iter(rows)
+        max_in_flight = 2 * self._workers
+        pending: deque[Future[list[TRow]]] = deque()
+        running: set[Future[list[TRow]]] = set()
+        executor = ProcessPoolExecutor(self._workers, initializer=_init_map_worker, initargs=(self._mapper,))
+        try:
+            while chunk := list(islice(iterator, self._chunk_size)):
+                future = executor.submit(_map_chunk, chunk)
+                del chunk
+                # finished chunks are yielded before the next input is read, blocking only on a full window
+                if self._ordered:
+                    pending.append(future)
+                    while pending and (pending[0].done() or len(pending) >= max_in_flight):
+                        yield from pending.popleft().result()
+                    continue
+
+                running.add(future)
+                timeout = None if len(running) >= max_in_flight else 0
+                done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+
+            while pending:
+                yield from pending.popleft().result()
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        finally:
+            executor.shutdown(cancel_futures=True)
 
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        if self._workers > 1:
+            yield from self._parallel(rows)
+            return
+
         for row in rows:
             yield from self._mapper(row)
 
@@ -69,6 +141,54 @@ class Reducer(ABC):
         pass
 
 
+class CombinableReducer(Reducer):
+    """
+    Base class for reducers folding a group into a partial state.
+    States of parts of a group can be merged in order, so the group need not be contiguous.
+    """
+    @abstractmethod
+    def start(self, row: TRow) -> tp.Any:
+        """
+        :param row: first row of a group part
+        :return: state of the part
+        """
+        pass
+
+    @abstractmethod
+    def update(self, state: tp.Any, row: TRow) -> tp.Any:
+        """
+        :param state: state of the part so far
+        :param row: next row of the part
+        :return: updated state
+        """
+        pass
+
+    @abstractmethod
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        """
+        :param state: state of earlier rows of a group
+        :param other: state of later rows of the same group
+        :return: state of both parts
+        """
+        pass
+
+    @abstractmethod
+    def finish(self, group_key: tuple[tp.Any, ...], state: tp.Any) -> TRowsGenerator:
+        """
+        :param group_key: key of the group
+        :param state: state of the whole group
+        """
+        pass
+
+    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
+        iterator = iter(rows)
+        for first in iterator:
+            state = self.start(first)
+            for row in iterator:
+                state = self.update(state, row)
+            yield from self.finish(group_key, state)
+
+
 class Reduce(Operation):
     def __init__(self, reducer: Reducer, keys: tp.Sequence[str]) -> None:
         self._reducer = reducer
@@ -82,6 +202,84 @@ class Reduce(Operation):
             yield from self._reducer(key, group)
 
 
+class HashReduce(Operation):
+    """
+    Reduce without sorting: rows are folded into a dict of partial states by key.
+    When the dict grows past max_keys_in_memory, its states are hash-partitioned into temporary
+    files and the dict is cleared. Each partition is merged back separately at the end,
+    partitioning it again by a salted hash if it is still too large.
+    Keys are compared by value, not by str. Output order is the order of first occurrence
+    while nothing was spilled, otherwise unspecified.
+    """
+    max_levels = 4
+
+    def __init__(self, reducer: CombinableReducer, keys: tp.Sequence[str],
+                 max_keys_in_memory: int = 100_000, partitions: int = 16) -> None:
+        """
+        :param reducer: reducer to fold groups with
+        :param keys: columns to group by
+        :param max_keys_in_memory: distinct keys kept in memory before states are spilled
+        :param partitions: number of files states are spilled to
+        """
+        if max_keys_in_memory < 1 or partitions < 1:
+            raise ValueError('max_keys_in_memory and partitions must be positive')
+        self._reducer = reducer
+        self._keys = keys
+        self._max_keys = max_keys_in_memory
+        self._partitions = partitions
+        # scalar for a single key, tuple otherwise: cheaper than building a tuple per row
+        self._key_getter = operator.itemgetter(*keys) if keys else lambda r: ()
+
+    def _spill(self, table: dict[tp.Any, tp.Any], runs: list[tp.IO[bytes]], level: int) -> None:
+        chunks: list[list[tuple[tp.Any, tp.Any]]] = [[] for _ in runs]
+        for key, state in table.items():
+            chunks[hash((level, key)) % len(runs)].append((key, state))
+        for run, chunk in zip(runs, chunks):
+            if chunk:
+                pickle.dump(chunk, run, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _merge_pair(self, state: tp.Any, pair: tuple[tp.Any, tp.Any]) -> tp.Any:
+        return self._reducer.merge(state, pair[1])
+
+    def _combine(self, items: tp.Iterable[tp.Any], key_getter: tp.Callable[[tp.Any], tp.Any],
+                 start: tp.Callable[[tp.Any], tp.Any], fold: tp.Callable[[tp.Any, tp.Any], tp.Any],
+                 level: int) -> tp.Generator[tuple[tp.Any, tp.Any], None, None]:
+        table: dict[tp.Any, tp.Any] = {}
+        runs: list[tp.IO[bytes]] = []
+        can_spill = level < self.max_levels
+        try:
+            for item in items:
+                key = key_getter(item)
+                if key in table:
+                    table[key] = fold(table[key], item)
+                    continue
+                if can_spill and len(table) >= self._max_keys:
+                    if not runs:
+                        runs = [tempfile.TemporaryFile() for _ in range(self._partitions)]
+                    self._spill(table, runs, level)
+                    table = {}
+                table[key] = start(item)
+
+            if not runs:
+                yield from table.items()
+                return
+
+            self._spill(table, runs, level)
+            table = {}
+            for run in runs:
+                run.seek(0)
+                yield from self._combine(_read_chunks(run), operator.itemgetter(0), operator.itemgetter(1),
+                                         self._merge_pair, level + 1)
+        finally:
+            for run in runs:
+                run.close()
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        single_key = len(self._keys) == 1
+        for key, state in self._combine(rows, self._key_getter, self._reducer.start, self._reducer.update, 0):
+            yield from self._reducer.finish((key,) if single_key else key, state)
+
+
 class Joiner(ABC):
     """Base class for joiners"""
     def __init__(self, suffix_a: str = '_1', suffix_b: str = '_2') -> None:
@@ -120,17 +318,87 @@ class Joiner(ABC):
 
 
 class Join(Operation):
-    def __init__(self, joiner: Joiner, keys: tp.Sequence[str]):
+    """
+    Join two tables by keys.
+    strategy='merge' expects both tables sorted by keys and merges their key groups.
+    strategy='hash' needs no sorting: both tables are read in turn until one of them ends,
+    the smaller one is put into a dict by key and the other one is streamed through it.
+    """
+    strategies = ('merge', 'hash')
+
+    def __init__(self, joiner: Joiner, keys: tp.Sequence[str], strategy: str = 'merge'):
+        if strategy not in self.strategies:
+            raise ValueError(f'unknown join strategy {strategy!r}, expected one of {self.strategies}')
         self._keys = keys
         self._joiner = joiner
+        self._strategy = strategy
 
     def key_func(self, r):
         return tuple(str(r[k]) for k in self._keys)
 
+    @staticmethod
+    def _smaller_side(rows_a: TRowsIterable, rows_b: TRowsIterable) -> tuple[bool, list[TRow], TRowsIterable]:
+        """
+        :return: whether rows_a is the smaller table, rows of the smaller table, rows of the other one
+        """
+        it_a, it_b = iter(rows_a), iter(rows_b)
+        buffer_a: list[TRow] = []
+        buffer_b: list[TRow] = []
+        while True:
+            row_b = next(it_b, None)
+            if row_b is None:
+                return False, buffer_b, chain(buffer_a, it_a)
+            buffer_b.append(row_b)
+
+            row_a = next(it_a, None)
+            if row_a is None:
+                return True, buffer_a, chain(buffer_b, it_b)
+            buffer_a.append(row_a)
+
+    def _hash_join(self, rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
+        build_a, build_rows, probe_rows = self._smaller_side(rows_a, rows_b)
+
+        key_func = self.key_func
+        if len(self._keys) == 1:
+            column = self._keys[0]
+
+            def key_func(r):
+                return (str(r[column]),)
+
+        table: dict[tuple[str, ...], list[TRow]] = {}
+        for row in build_rows:
+            table.setdefault(key_func(row), []).append(row)
+        del build_rows
+
+        matched = set()
+        for row in probe_rows:
+            key = key_func(row)
+            group = table.get(key)
+            if group is None:
+                group = []
+            else:
+                matched.add(key)
+            if build_a:
+                yield from self._joiner(self._keys, group, [row])
+            else:
+                yield from self._joiner(self._keys, [row], group)
+
+        for key, group in table.items():
+            if key in matched:
+                continue
+            if build_a:
+                yield from self._joiner(self._keys, group, [])
+            else:
+                yield from self._joiner(self._keys, [], group)
+
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
         rows_a = rows
         rows_b = args[0]
 
+        if self._strategy == 'hash':
+            yield from self._hash_join(rows_a, rows_b)
+            return
+
         it_a = groupby(rows_a, key=self.key_func)
         it_b = groupby(rows_b, key=self.key_func)
 
@@ -158,6 +426,228 @@ class Join(Operation):
                 key_b, group_b = get_next_group(it_b)
 
 
+def _read_chunks(run: tp.IO[bytes]) -> tp.Generator[tp.Any, None, None]:
+    """Yield items of lists pickled one after another into run"""
+    while True:
+        try:
+            chunk = pickle.load(run)
+        except EOFError:
+            return
+        yield from chunk
+
+
+class Sort(Operation):
+    """
+    External merge sort by keys.
+    Rows are buffered up to max_rows_in_memory, each full buffer is sorted and spilled
+    to a temporary file as a run, then runs are k-way merged with heapq.merge.
+    Order matches key_func of Reduce and Join, so the output can be fed straight into them.
+    """
+    def __init__(self, keys: tp.Sequence[str], max_rows_in_memory: int = 100_000,
+                 spill_chunk_rows: int = 1024) -> None:
+        """
+        :param keys: columns to sort by
+        :param max_rows_in_memory: rows buffered before a sorted run is spilled to disk
+        :param spill_chunk_rows: rows pickled together in a run file and read back at once
+        """
+        if max_rows_in_memory < 1 or spill_chunk_rows < 1:
+            raise ValueError('max_rows_in_memory and spill_chunk_rows must be positive')
+        self._keys = keys
+        self._max_rows = max_rows_in_memory
+        self._chunk_rows = min(spill_chunk_rows, max_rows_in_memory)
+
+    def key_func(self, r):
+        return tuple(str(r[k]) for k in self._keys)
+
+    def _spill(self, buffer: list[TRow]) -> tp.IO[bytes]:
+        buffer.sort(key=self.key_func)
+        run = tempfile.TemporaryFile()
+        for start in range(0, len(buffer), self._chunk_rows):
+            pickle.dump(buffer[start:start + self._chunk_rows], run, protocol=pickle.HIGHEST_PROTOCOL)
+        run.seek(0)
+        return run
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        runs: list[tp.IO[bytes]] = []
+        buffer: list[TRow] = []
+        try:
+            for row in rows:
+                buffer.append(row)
+                if len(buffer) >= self._max_rows:
+                    runs.append(self._spill(buffer))
+                    buffer = []
+
+            if not runs:
+                buffer.sort(key=self.key_func)
+                yield from buffer
+                return
+
+            if buffer:
+                runs.append(self._spill(buffer))
+                buffer = []
+            yield from heapq.merge(*(_read_chunks(run) for run in runs), key=self.key_func)
+        finally:
+            for run in runs:
+                run.close()
+
+
+# Execution
+
+
+def _dump_chunks(path: str, items: tp.Iterable[tp.Any], chunk_size: int) -> None:
+    """Write items to path as pickled lists of up to chunk_size items, readable by _read_chunks"""
+    with open(path, 'wb') as f:
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                chunk = []
+        if chunk:
+            pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_chunks(path: str) -> tp.Generator[tp.Any, None, None]:
+    with open(path, 'rb') as f:
+        yield from _read_chunks(f)
+
+
+def _shard_of(key: tuple[str, ...], shards: int) -> int:
+    # crc32 instead of hash: str hashes are salted per process
+    return zlib.crc32('\x1f'.join(key).encode()) % shards
+
+
+_worker_job: 'MapReduce | None' = None
+
+
+def _init_mapreduce_worker(job: 'MapReduce') -> None:
+    global _worker_job
+    _worker_job = job
+
+
+def _map_task(src: str, dst_prefix: str) -> list[str]:
+    assert _worker_job is not None
+    return _worker_job._map_shard_files(src, dst_prefix)
+
+
+def _reduce_task(srcs: list[str], dst: str) -> str:
+    assert _worker_job is not None
+    return _worker_job._reduce_shard_files(srcs, dst)
+
+
+class MapReduce(Operation):
+    """
+    Map + Reduce over worker processes exchanging rows through files.
+    The main process cuts the input into files of task_size rows, one map task each.
+    A map task applies the mapper and splits its output by hash of the reduce key into
+    one file per shard; rows of a CombinableReducer are folded into partial states by key
+    on the way (local combine). A reduce task then takes files of one shard from all map
+    tasks (shuffle) and reduces them: partial states are merged, other rows go through
+    Sort and Reduce. Outputs of shards are concatenated in shard order.
+    Partial states are combined like in HashReduce, spilling to disk past max_keys_in_memory keys.
+    Keys are compared like in Reduce, by str.
+    """
+    def __init__(self, mapper: Mapper, reducer: Reducer, keys: tp.Sequence[str], shards: int = 8,
+                 workers: int | None = None, task_size: int = 100_000, chunk_size: int = 1024,
+                 max_keys_in_memory: int = 100_000) -> None:
+        """
+        :param mapper: mapper to apply to input rows
+        :param reducer: reducer to apply to groups of mapped rows
+        :param keys: columns to reduce by
+        :param shards: number of reduce tasks
+        :param workers: number of worker processes, os.cpu_count() by default
+        :param task_size: input rows per map task
+        :param chunk_size: rows pickled together in exchange files
+        :param max_keys_in_memory: partial states a task keeps in memory before spilling them
+        """
+        if shards < 1 or task_size < 1 or chunk_size < 1 or (workers is not None and workers < 1):
+            raise ValueError('shards, workers, task_size and chunk_size must be positive')
+        if max_keys_in_memory < 1:
+            raise ValueError('max_keys_in_memory must be positive')
+        self._mapper = mapper
+        self._reducer = reducer
+        self._keys = keys
+        self._shards = shards
+        self._workers = workers or os.cpu_count() or 1
+        self._task_size = task_size
+        self._chunk_size = chunk_size
+        self._max_keys = max_keys_in_memory
+        self._reduce = Reduce(reducer, keys)
+
+    def _combiner(self) -> HashReduce:
+        assert isinstance(self._reducer, CombinableReducer)
+        return HashReduce(self._reducer, self._keys, max_keys_in_memory=self._max_keys)
+
+    def _map_shard_files(self, src: str, dst_prefix: str) -> list[str]:
+        """Map rows of src and split them by shard into files dst_prefix + shard number"""
+        rows = Map(self._mapper)(_load_chunks(src))
+        if isinstance(self._reducer, CombinableReducer):
+            combiner = self._combiner()
+            states = combiner._combine(rows, self._reduce.key_func, self._reducer.start, self._reducer.update, 0)
+            items: tp.Iterable[tuple[int, tp.Any]] = (
+                (_shard_of(key, self._shards), (key, state)) for key, state in states)
+        else:
+            items = ((_shard_of(self._reduce.key_func(row), self._shards), row) for row in rows)
+
+        paths = [f'{dst_prefix}{shard}' for shard in range(self._shards)]
+        files = [open(path, 'wb') for path in paths]
+        try:
+            chunks: list[list[tp.Any]] = [[] for _ in files]
+            for shard, item in items:
+                chunk = chunks[shard]
+                chunk.append(item)
+                if len(chunk) >= self._chunk_size:
+                    pickle.dump(chunk, files[shard], protocol=pickle.HIGHEST_PROTOCOL)
+                    chunks[shard] = []
+            for f, chunk in zip(files, chunks):
+                if chunk:
+                    pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for f in files:
+                f.close()
+        os.remove(src)
+        return paths
+
+    def _reduce_shard_files(self, srcs: list[str], dst: str) -> str:
+        """Reduce rows of one shard from files of all map tasks into dst"""
+        items = chain.from_iterable(_load_chunks(src) for src in srcs)
+        if isinstance(self._reducer, CombinableReducer):
+            combiner = self._combiner()
+            states = combiner._combine(items, operator.itemgetter(0), operator.itemgetter(1), combiner._merge_pair, 0)
+            rows = chain.from_iterable(self._reducer.finish(key, state) for key, state in states)
+        else:
+            rows = self._reduce(Sort(self._keys)(items))
+        _dump_chunks(dst, rows, self._chunk_size)
+        for src in srcs:
+            os.remove(src)
+        return dst
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        iterator = iter(rows)
+        with tempfile.TemporaryDirectory(prefix='mapreduce_') as workdir, \
+                ProcessPoolExecutor(self._workers, initializer=_init_mapreduce_worker, initargs=(self,)) as executor:
+            map_futures = []
+            while True:
+                task = len(map_futures)
+                src = os.path.join(workdir, f'input_{task}')
+                _dump_chunks(src, islice(iterator, self._task_size), self._chunk_size)
+                if task > 0 and os.path.getsize(src) == 0:
+                    break
+                map_futures.append(executor.submit(_map_task, src, os.path.join(workdir, f'map_{task}_shard_')))
+
+            shard_files: list[list[str]] = [[] for _ in range(self._shards)]
+            for future in map_futures:
+                for shard, path in enumerate(future.result()):
+                    shard_files[shard].append(path)
+
+            reduce_futures = [executor.submit(_reduce_task, srcs, os.path.join(workdir, f'output_{shard}'))
+                              for shard, srcs in enumerate(shard_files)]
+            for future in reduce_futures:
+                path = future.result()
+                yield from _load_chunks(path)
+                os.remove(path)
+
+
 # Dummy operators
 
 
@@ -302,7 +792,7 @@ class Project(Mapper):
 # Reducers
 
 
-class TopN(Reducer):
+class TopN(CombinableReducer):
     """Calculate top N by value"""
     def __init__(self, column: str, n: int) -> None:
         """
@@ -312,27 +802,38 @@ class TopN(Reducer):
         self._column_max = column
         self._n = n
 
-    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        heap = []
-        for i, row in enumerate(rows):
-            val = row.get(self._column_max)
-            if val is None:
-                continue
-
-            item = (val, i, row)
-
-            if len(heap) < self._n:
-                heapq.heappush(heap, item)
-            else:
-                if val > heap[0][0]:
-                    heapq.heapreplace(heap, item)
-
-        result = sorted(heap, key=lambda x: x[0], reverse=True)
-        for _, _, row in result:
+    def _push(self, heap: list[tuple[tp.Any, int, TRow]], item: tuple[tp.Any, int, TRow]) -> None:
+        # items are (value, -row number, row): among equal values the earliest row wins,
+        # so top N of partial states merged in any order matches a single pass
+        if len(heap) < self._n:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
+
+    def start(self, row: TRow) -> tp.Any:
+        return self.update([[], 0], row)
+
+    def update(self, state: tp.Any, row: TRow) -> tp.Any:
+        heap, i = state
+        state[1] = i + 1
+        val = row.get(self._column_max)
+        if val is not None:
+            self._push(heap, (val, -i, row))
+        return state
+
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        heap, offset = state
+        for val, neg_i, row in other[0]:
+            self._push(heap, (val, neg_i - offset, row))
+        state[1] = offset + other[1]
+        return state
+
+    def finish(self, group_key: tuple[tp.Any, ...], state: tp.Any) -> TRowsGenerator:
+        for _, _, row in sorted(state[0], reverse=True):
             yield row
 
 
-class TermFrequency(Reducer):
+class TermFrequency(CombinableReducer):
     """Calculate frequency of values in column"""
 
     def __init__(self, words_column: str, result_column: str = 'tf') -> None:
@@ -343,24 +844,32 @@ class TermFrequency(Reducer):
         self._words_column = words_column
         self._result_column = result_column
 
-    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        total_count = 0
-        word_counts = defaultdict(int)
-        row_templates = {}
-
-        for row in rows:
-            total_count += 1
-            word = row.get(self._words_column)
-            word_counts[word] += 1
-
-            if word not in row_templates:
-                row_templates[word] = row
+    def start(self, row: TRow) -> tp.Any:
+        return self.update([0, {}], row)
 
-        if total_count == 0:
-            return
+    def update(self, state: tp.Any, row: TRow) -> tp.Any:
+        state[0] += 1
+        word = row.get(self._words_column)
+        counts = state[1]
+        if word in counts:
+            counts[word][1] += 1
+        else:
+            counts[word] = [row, 1]
+        return state
+
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        state[0] += other[0]
+        counts = state[1]
+        for word, (template, count) in other[1].items():
+            if word in counts:
+                counts[word][1] += count
+            else:
+                counts[word] = [template, count]
+        return state
 
-        for word, count in word_counts.items():
-            template = row_templates[word]
+    def finish(self, group_key: tuple[tp.Any, ...], state: tp.Any) -> TRowsGenerator:
+        total_count, word_counts = state
+        for template, count in word_counts.values():
             new_row = template.copy()
 
             if 'count' in new_row:
@@ -370,7 +879,7 @@ class TermFrequency(Reducer):
             yield new_row
 
 
-class Count(Reducer):
+class Count(CombinableReducer):
     """
     Count records by key
     Example for group_key=('a',) and column='d'
@@ -386,23 +895,27 @@ class Count(Reducer):
         """
         self._column = column
 
-    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        count: int = 0
-        template = None
-        for row in rows:
-            if template is None:
-                template = row
-            count += 1 #type: ignore
+    def start(self, row: TRow) -> tp.Any:
+        return [row, 1]
 
-        if template is not None:
-            new_row = template.copy()
-            new_row[self._column] = count
-            if 'sentence_id' in new_row:
-                del new_row['sentence_id']
-            yield new_row
+    def update(self, state: tp.Any, row: TRow) -> tp.Any:
+        state[1] += 1
+        return state
 
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        state[1] += other[1]
+        return state
+
+    def finish(self, group_key: tuple[tp.Any, ...], state: tp.Any) -> TRowsGenerator:
+        template, count = state
+        new_row = template.copy()
+        new_row[self._column] = count
+        if 'sentence_id' in new_row:
+            del new_row['sentence_id']
+        yield new_row
 
-class Sum(Reducer):
+
+class Sum(CombinableReducer):
     """
     Sum values aggregated by key
     Example for key=('a',) and column='b'
@@ -418,24 +931,28 @@ class Sum(Reducer):
         """
         self._column = column
 
-    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        total = 0.0
-        template = None
-        for row in rows:
-            if template is None:
-                template = row
-            val = row.get(self._column, 0)
-            try:
-                total += float(val) #type: ignore
-            except (TypeError, ValueError):
-                pass
-
-        if template is not None:
-            new_row = template.copy()
-            new_row[self._column] = total if not total.is_integer() else int(total)
-            if 'player_id' in new_row:
-                del new_row['player_id']
-            yield new_row
+    def start(self, row: TRow) -> tp.Any:
+        return self.update([row, 0.0], row)
+
+    def update(self, state: tp.Any, row: TRow) -> tp.Any:
+        val = row.get(self._column, 0)
+        try:
+            state[1] += float(val) #type: ignore
+        except (TypeError, ValueError):
+            pass
+        return state
+
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        state[1] += other[1]
+        return state
+
+    def finish(self, group_key: tuple[tp.Any, ...], state: tp.Any) -> TRowsGenerator:
+        template, total = state
+        new_row = template.copy()
+        new_row[self._column] = total if not total.is_integer() else int(total)
+        if 'player_id' in new_row:
+            del new_row['player_id']
+        yield new_row
 
 
 # Joiners
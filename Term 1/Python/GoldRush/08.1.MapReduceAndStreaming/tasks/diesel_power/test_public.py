@@ -193,6 +193,37 @@ def test_mapper(case: MapCase) -> None:
     assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
 
 
+@pytest.mark.parametrize('ordered', [True, False])
+@pytest.mark.parametrize('case', MAP_CASES)
+def test_parallel_mapper(case: MapCase, ordered: bool) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    result = operations.Map(case.mapper, workers=2, chunk_size=2, ordered=ordered)(iter(case.data))
+    assert isinstance(result, tp.Iterator)
+    result = list(result)
+    assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
+    if ordered:
+        assert result == list(operations.Map(case.mapper)(iter(case.data)))
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_parallel_mapper_yields_early(ordered: bool) -> None:
+    # slow source: the first chunk is mapped long before the window of 2 * workers chunks fills up
+    read = 0
+
+    def slow_rows() -> operations.TRowsGenerator:
+        nonlocal read
+        for i in range(8):
+            time.sleep(0.3)
+            read += 1
+            yield {'test_id': i, 'text': 'a b'}
+
+    result = operations.Map(operations.DummyMapper(), workers=2, chunk_size=1, ordered=ordered)(slow_rows())
+    assert next(result) == {'test_id': 0, 'text': 'a b'}
+    assert read < 4
+    assert len(list(result)) == 7
+
+
 @dataclasses.dataclass
 class ReduceCase:
     reducer: operations.Reducer
@@ -389,6 +420,51 @@ def test_reducer(case: ReduceCase) -> None:
     assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
 
 
+@pytest.mark.parametrize('max_keys_in_memory', [1, 2, 1000])
+@pytest.mark.parametrize('case', [case for case in REDUCE_CASES
+                                  if isinstance(case.reducer, operations.CombinableReducer)])
+def test_hash_reducer(case: ReduceCase, max_keys_in_memory: int) -> None:
+    # groups come out in no particular order
+    key_func = _Key(*case.cmp_keys, *case.reducer_keys)
+
+    result = operations.HashReduce(case.reducer, case.reducer_keys, max_keys_in_memory=max_keys_in_memory,
+                                   partitions=2)(iter(case.data))
+    assert isinstance(result, tp.Iterator)
+    assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
+
+    # unsorted input needs no sort step and gives the same groups as Sort + Reduce
+    data = case.data[::-1]
+    result = operations.HashReduce(case.reducer, case.reducer_keys, max_keys_in_memory=max_keys_in_memory,
+                                   partitions=2)(iter(data))
+    expected = operations.Reduce(case.reducer, case.reducer_keys)(
+        operations.Sort(case.reducer_keys)(iter(data)))
+    assert sorted(result, key=key_func) == sorted(expected, key=key_func)
+
+
+TOP_TIES_DATA = [
+    {'k': 1, 'v': 0, 'id': 0}, {'k': 0, 'v': 1, 'id': 1}, {'k': 2, 'v': 2, 'id': 2}, {'k': 1, 'v': 0, 'id': 3},
+    {'k': 1, 'v': 0, 'id': 4}, {'k': 1, 'v': 2, 'id': 5}, {'k': 2, 'v': 2, 'id': 6}, {'k': 1, 'v': 0, 'id': 7}
+]
+
+
+@pytest.mark.parametrize('partitions', [1, 2])
+@pytest.mark.parametrize('max_keys_in_memory', [1, 2, 1000])
+def test_hash_reduce_top_ties(max_keys_in_memory: int, partitions: int) -> None:
+    # ties keep the earliest rows, however the partial states were spilled and merged
+    reducer = operations.TopN(column='v', n=2)
+    result = operations.HashReduce(reducer, ('k',), max_keys_in_memory=max_keys_in_memory,
+                                   partitions=partitions)(iter(TOP_TIES_DATA))
+    expected = list(operations.Reduce(reducer, ('k',))(operations.Sort(('k',))(iter(TOP_TIES_DATA))))
+    assert [row['id'] for row in expected] == [1, 5, 0, 2, 6]
+    assert sorted(result, key=lambda row: row['k']) == expected
+
+
+def test_hash_reduce_keeps_key_types() -> None:
+    data = [{'key': 1}, {'key': '1'}, {'key': 1}]
+    result = operations.HashReduce(operations.Count(column='count'), ('key',))(iter(data))
+    assert list(result) == [{'key': 1, 'count': 2}, {'key': '1', 'count': 1}]
+
+
 @dataclasses.dataclass
 class JoinCase:
     joiner: operations.Joiner
@@ -602,6 +678,80 @@ def test_joiner(case: JoinCase) -> None:
     assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
 
 
+@pytest.mark.parametrize('case', JOIN_CASES)
+def test_hash_joiner(case: JoinCase) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    # unsorted input of any relative size, either side may end up in the hash table
+    for data_left, data_right in [(case.data_left, case.data_right),
+                                  (case.data_left[::-1], case.data_right[::-1]),
+                                  (case.data_left[:1], case.data_right),
+                                  (case.data_left, case.data_right[:1])]:
+        expected = operations.Join(case.joiner, case.join_keys)(
+            operations.Sort(case.join_keys)(iter(data_left)), operations.Sort(case.join_keys)(iter(data_right)))
+        result = operations.Join(case.joiner, case.join_keys, strategy='hash')(iter(data_left), iter(data_right))
+        assert isinstance(result, tp.Iterator)
+        assert sorted(result, key=key_func) == sorted(expected, key=key_func)
+
+
+def test_join_unknown_strategy() -> None:
+    with pytest.raises(ValueError):
+        operations.Join(operations.InnerJoiner(), ('key',), strategy='nested_loop')
+
+
+@pytest.mark.parametrize('max_rows_in_memory', [1, 3, 1000])
+def test_sort(max_rows_in_memory: int) -> None:
+    data = [{'key': (i * 7) % 11, 'sub': i % 3, 'n': i} for i in range(50)]
+    sort_key = _Key('key', 'sub')
+
+    result = operations.Sort(('key', 'sub'), max_rows_in_memory=max_rows_in_memory)(iter(data))
+    assert isinstance(result, tp.Iterator)
+    assert list(result) == sorted(data, key=sort_key)
+
+
+def test_sort_then_reduce() -> None:
+    data = [{'word': word} for word in 'b a c a b a'.split()]
+    rows = operations.Sort(('word',), max_rows_in_memory=2)(iter(data))
+    result = operations.Reduce(operations.Count(column='count'), ('word',))(rows)
+    assert list(result) == [{'word': 'a', 'count': 3}, {'word': 'b', 'count': 2}, {'word': 'c', 'count': 1}]
+
+
+@pytest.mark.parametrize('reducer, reduce_keys', [
+    (operations.Count(column='count'), ('text',)),
+    (operations.Sum(column='doc_id'), ('text',)),
+    (operations.TermFrequency(words_column='text'), ('doc_id',)),
+    (operations.TopN(column='doc_id', n=2), ('text',)),
+    (operations.FirstReducer(), ('doc_id', 'text')),
+])
+def test_map_reduce(reducer: operations.Reducer, reduce_keys: tuple[str, ...]) -> None:
+    texts = ['hello little world', 'Little Little', 'hello'] * 5
+    data = [{'doc_id': i % 7, 'text': text} for i, text in enumerate(texts)]
+    mapper = operations.Split(column='text')
+    key_func = _Key('doc_id', 'text', 'count', 'tf')
+
+    expected = operations.Reduce(reducer, reduce_keys)(
+        operations.Sort(reduce_keys)(operations.Map(mapper)(iter(data))))
+    result = operations.MapReduce(mapper, reducer, reduce_keys, shards=3, workers=2, task_size=4,
+                                  chunk_size=2)(iter(data))
+    assert isinstance(result, tp.Iterator)
+    assert sorted(result, key=key_func) == sorted(expected, key=key_func)
+
+
+@pytest.mark.parametrize('max_keys_in_memory', [1, 1000])
+def test_map_reduce_top_ties(max_keys_in_memory: int) -> None:
+    # partial states of one key come from several map tasks and spills, ties still keep the earliest rows
+    reducer = operations.TopN(column='v', n=2)
+    expected = list(operations.Reduce(reducer, ('k',))(operations.Sort(('k',))(iter(TOP_TIES_DATA))))
+    result = operations.MapReduce(operations.DummyMapper(), reducer, ('k',), shards=2, workers=2, task_size=3,
+                                  chunk_size=1, max_keys_in_memory=max_keys_in_memory)(iter(TOP_TIES_DATA))
+    assert sorted(result, key=lambda row: row['k']) == expected
+
+
+def test_map_reduce_empty() -> None:
+    op = operations.MapReduce(operations.DummyMapper(), operations.Count(column='count'), ('key',), workers=1)
+    assert list(op(iter([]))) == []
+
+
 # ########## HEAVY TESTS WITH MEMORY TRACKING ##########
 
 
@@ -647,6 +797,15 @@ def test_heavy_map(func_mapper: operations.Mapper, additional_memory: int, basel
     run_and_track_memory(lambda: next(op), baseline_memory + additional_memory)
 
 
+@pytest.mark.parametrize('ordered', [True, False])
+def test_heavy_parallel_map(ordered: bool, baseline_memory: int) -> None:
+    map_op = operations.Map(operations.LowerCase(column='data'), workers=2, chunk_size=1000, ordered=ordered)
+    op = map_op(get_map_data())
+    run_and_track_memory(lambda: next(op), baseline_memory + 2 * MiB)
+    # the rest of the table streams through the pool without piling up
+    run_and_track_memory(lambda: sum(1 for _ in op), baseline_memory + 2 * MiB)
+
+
 def test_heavy_split(baseline_memory: int) -> None:
     func_map = operations.Split(column='data', separator='E')
     record = {'data': 'E' * 100500, 'n': 2}
@@ -654,6 +813,18 @@ def test_heavy_split(baseline_memory: int) -> None:
     run_and_track_memory(lambda: next(op), baseline_memory + 500 * KiB)
 
 
+def get_distinct_keys_data() -> tp.Generator[dict[str, tp.Any], None, None]:
+    time.sleep(0.1)  # Some sleep for watchdog catch the memory change
+    for i in range(400000):
+        yield {'key': i % 200000, 'value': i}
+
+
+def test_heavy_hash_reduce(baseline_memory: int) -> None:
+    op = operations.HashReduce(operations.Sum(column='value'), ('key', ),
+                               max_keys_in_memory=10000)(get_distinct_keys_data())
+    run_and_track_memory(lambda: next(op), baseline_memory + 10 * MiB)
+
+
 def get_reduce_data() -> tp.Generator[dict[str, tp.Any], None, None]:
     for letter in ['a', 'b', 'c', 'ddd']:
         time.sleep(0.1)  # Some sleep for watchdog catch the memory change
@@ -695,3 +866,31 @@ def get_complexity_join_data() -> tp.Generator[dict[str, tp.Any], None, None]:
 ])
 def test_complexity_join(func_joiner: operations.Joiner) -> None:
     list(operations.Join(func_joiner, ('key', ))(get_complexity_join_data(), get_complexity_join_data()))
+
+
+def get_dimension_data() -> tp.Generator[dict[str, tp.Any], None, None]:
+    for n in range(0, 100500, 100):
+        yield {'key': n, 'name': f'name_{n}'}
+
+
+@pytest.mark.parametrize('func_joiner', [
+    operations.InnerJoiner(),
+    operations.LeftJoiner(),
+    operations.RightJoiner(),
+    operations.OuterJoiner()
+])
+def test_complexity_hash_join(func_joiner: operations.Joiner) -> None:
+    join = operations.Join(func_joiner, ('key', ), strategy='hash')
+    list(join(get_complexity_join_data(), get_complexity_join_data()))
+    list(join(get_complexity_join_data(), get_dimension_data()))
+
+
+def get_sort_data() -> tp.Generator[dict[str, tp.Any], None, None]:
+    time.sleep(0.1)  # Some sleep for watchdog catch the memory change
+    for i in range(500000):
+        yield {'key': (i * 7919) % 500000, 'value': i}
+
+
+def test_heavy_sort(baseline_memory: int) -> None:
+    op = operations.Sort(('key', ), max_rows_in_memory=10000)(get_sort_data())
+    run_and_track_memory(lambda: next(op), baseline_memory + 10 * MiB)